@@ -1,18 +1,34 @@
+import asyncio
 import json
 import os
-from typing import Optional
-from uuid import UUID
+import tempfile
+import time
+from typing import Any, Optional
+from uuid import UUID, uuid4
 
 from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
-from fastapi.responses import RedirectResponse
+from fastapi.responses import FileResponse, RedirectResponse
 from pydantic import BaseModel
 from sqlmodel import Session, desc, select
 
 from src.api.auth import get_current_user
-from src.core.db import get_session
-from src.core.file_storage import S3FileStorage, file_storage
+from src.core.db import engine, get_session
+from src.core.file_storage import (
+    FileTooLargeError,
+    S3FileStorage,
+    file_storage,
+    remove_spool_file,
+)
+from src.core.ingestion import IngestionJob, ProgressCallback, ingestion_queue
+from src.core.insights import insight_generator
+from src.core.knowledge_base_blobs import acquire_blob, find_processed_copy, release_file
 from src.core.rag import rag_service
-from src.core.settings import ALLOWED_EXTENSIONS, APP_SETTINGS, MAX_FILE_SIZE
+from src.core.settings import (
+    ALLOWED_EXTENSIONS,
+    APP_SETTINGS,
+    MAX_FILE_SIZE,
+    UPLOAD_SPOOL_FOLDER,
+)
 from src.models.knowledge_base import KnowledgeBase, KnowledgeBaseInsight
 from src.models.user import User
 
@@ -50,30 +66,239 @@ class KnowledgeBaseInsightResponse(BaseModel):
     processing_time: Optional[float] = None
 
 
+class KnowledgeBaseStatusResponse(BaseModel):
+    id: str
+    processing_status: str
+    progress: Optional[dict[str, Any]] = None
+
+
 class TextUploadRequest(BaseModel):
     text: str
     title: str = "Text Input"
 
 
 def process_document_insights(
-    file_path: str, file_type: str, kb_id: str, filename: str, user_id: UUID
+    file_path: str,
+    file_type: str,
+    kb_id: str,
+    filename: str,
+    user_id: UUID,
+    progress_callback: Optional[ProgressCallback] = None,
+    spool_path: Optional[str] = None,
 ) -> dict:
     """
-    Process document using RAG service to extract insights
+    Process a stored document using RAG service to extract insights
     """
     try:
-        return rag_service.process_document(file_path, file_type, kb_id, filename, user_id)
+        if spool_path is not None:
+            # Local copy written while the upload was stored, removed once processed
+            try:
+                return rag_service.process_document(
+                    spool_path,
+                    file_type,
+                    kb_id,
+                    filename,
+                    user_id,
+                    progress_callback,
+                    insight_generator.deferred,
+                )
+            finally:
+                remove_spool_file(spool_path)
+
+        if not APP_SETTINGS.is_aws:
+            # For local storage, use the file path directly
+            return rag_service.process_document(
+                file_path,
+                file_type,
+                kb_id,
+                filename,
+                user_id,
+                progress_callback,
+                insight_generator.deferred,
+            )
+
+        # For S3, we need to download the file temporarily for processing
+        assert isinstance(file_storage, S3FileStorage)
+        with tempfile.NamedTemporaryFile(delete=False, suffix=f".{file_type}") as temp_file:
+            temp_file_path = temp_file.name
+        try:
+            file_storage.s3_client.download_file(
+                file_storage.bucket_name, file_path, temp_file_path
+            )
+            return rag_service.process_document(
+                temp_file_path,
+                file_type,
+                kb_id,
+                filename,
+                user_id,
+                progress_callback,
+                insight_generator.deferred,
+            )
+        finally:
+            # Clean up temporary file
+            os.unlink(temp_file_path)
     except Exception as e:
         raise Exception(f"Error processing document: {str(e)}")
 
 
+def reuse_processed_copy(session: Session, source: KnowledgeBase, kb_entry: KnowledgeBase) -> bool:
+    """Complete a knowledge base from an earlier upload of the same file
+
+    Chunks, vectors and the insight are copied, so nothing is parsed, embedded or
+    sent to the LLM again. Return False when the copy failed and it must be processed.
+    """
+    start_time = time.time()
+    kb_id = str(kb_entry.id)
+    user_id = kb_entry.user_id
+    try:
+        rag_service.copy_knowledge_base(
+            str(source.id), source.user_id, kb_id, kb_entry.original_filename, user_id
+        )
+
+        source_insight = source.insight
+        insight = KnowledgeBaseInsight(
+            knowledge_base_id=kb_entry.id,
+            summary=source_insight.summary,
+            key_insights=source_insight.key_insights,
+            entities=source_insight.entities,
+            topics=source_insight.topics,
+            processed_content=source_insight.processed_content,
+            processing_time=time.time() - start_time,
+        )
+        session.add(insight)
+        kb_entry.processing_status = "completed"
+        session.add(kb_entry)
+        session.commit()
+        if insight.summary is None:
+            # Still deferred, queued after the source's so it reuses that insight's LLM call
+            insight_generator.schedule(kb_entry.id)
+        return True
+    except Exception as e:
+        print(f"Error reusing knowledge base {source.id} for {kb_id}: {e}")
+        session.rollback()
+        # Processed from scratch instead, copied chunks must not be indexed twice
+        rag_service.remove_knowledge_base(kb_id, user_id)
+        return False
+
+
+def queue_full_error() -> HTTPException:
+    return HTTPException(
+        status_code=503, detail="Too many documents are being processed, please retry later"
+    )
+
+
+def file_too_large_error() -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"File too large. Maximum size is {MAX_FILE_SIZE / (1024 * 1024):.1f}MB",
+    )
+
+
+def submit_document_processing(
+    session: Session, kb_entry: KnowledgeBase, spool_path: Optional[str]
+) -> None:
+    """Queue parsing, embedding and insights of an uploaded file on the ingestion workers"""
+    kb_id = kb_entry.id
+    user_id = kb_entry.user_id
+    filename = kb_entry.original_filename
+    file_type = kb_entry.file_type
+    stored_path = kb_entry.file_path
+
+    def discard_upload():
+        # Clean up uploaded file if processing failed
+        rag_service.remove_knowledge_base(str(kb_id), user_id)
+        with Session(engine) as cleanup_session:
+            failed_entry = cleanup_session.get(KnowledgeBase, kb_id)
+            if failed_entry:
+                release_file(cleanup_session, failed_entry)
+                cleanup_session.commit()
+        remove_spool_file(spool_path)
+
+    job = IngestionJob(
+        kb_id,
+        user_id,
+        lambda report: process_document_insights(
+            stored_path, file_type, str(kb_id), filename, user_id, report, spool_path
+        ),
+        on_failure=discard_upload,
+        on_cancel=lambda: remove_spool_file(spool_path),
+    )
+    if not ingestion_queue.submit(job):
+        release_file(session, kb_entry)
+        session.delete(kb_entry)
+        session.commit()
+        remove_spool_file(spool_path)
+        raise queue_full_error()
+
+
+def register_upload(
+    session: Session,
+    user_id: UUID,
+    storage_info: dict,
+    original_filename: str,
+    file_type: str,
+    spool_path: Optional[str],
+) -> KnowledgeBase:
+    """Record a saved upload, completed from an earlier copy of the file or queued for processing"""
+    # Identical files share one blob, stored under their content hash
+    content_hash = storage_info["content_hash"]
+    source = find_processed_copy(session, user_id, content_hash)
+    blob_path = acquire_blob(session, storage_info, file_type)
+
+    # Create knowledge base entry
+    kb_entry = KnowledgeBase(
+        user_id=user_id,
+        # The per-upload name is gone once the file is stored as a blob
+        filename=os.path.basename(blob_path),
+        original_filename=original_filename,
+        file_path=blob_path,
+        file_type=file_type,
+        file_size=storage_info["file_size"],
+        content_hash=content_hash,
+        processing_status="pending",
+    )
+
+    session.add(kb_entry)
+    session.commit()
+    session.refresh(kb_entry)
+
+    if source is not None and reuse_processed_copy(session, source, kb_entry):
+        remove_spool_file(spool_path)
+        session.refresh(kb_entry)
+    else:
+        submit_document_processing(session, kb_entry, spool_path)
+    return kb_entry
+
+
+def delete_knowledge_base_entry(session: Session, kb_id: UUID, user_id: UUID) -> bool:
+    """Delete a user's knowledge base with its vectors and file, False if it doesn't exist"""
+    # Get knowledge base entry
+    statement = (
+        select(KnowledgeBase)
+        .where(KnowledgeBase.id == kb_id)
+        .where(KnowledgeBase.user_id == user_id)
+    )
+    kb_entry = session.exec(statement).first()
+    if not kb_entry:
+        return False
+
+    # Delete from vector store
+    rag_service.remove_knowledge_base(str(kb_entry.id), user_id)
+
+    # Delete file from storage once no other knowledge base shares it
+    release_file(session, kb_entry)
+
+    # Delete from database
+    session.delete(kb_entry)
+    session.commit()
+    return True
+
+
 def validate_file(file: UploadFile) -> None:
     """Validate uploaded file"""
+    # Only an early reject, the size is client supplied and is enforced again while saving
     if file.size and file.size > MAX_FILE_SIZE:
-        raise HTTPException(
-            status_code=413,
-            detail=f"File too large. Maximum size is {MAX_FILE_SIZE / (1024 * 1024):.1f}MB",
-        )
+        raise file_too_large_error()
 
     if file.filename:
         file_ext = os.path.splitext(file.filename)[1].lower()
@@ -102,89 +327,33 @@ async def upload_file(
         # Reset file pointer
         await file.seek(0)
 
-        # Use file storage service
-        storage_info = file_storage.save_file(file.file, file.filename, file_extension)
-
-        # Create knowledge base entry
-        kb_entry = KnowledgeBase(
-            user_id=current_user.id,
-            filename=storage_info["filename"],
-            original_filename=file.filename,
-            file_path=storage_info["file_path"],
-            file_type=file_extension,
-            file_size=storage_info["file_size"],
-            processing_status="processing",
-        )
+        spool_path = None
+        if APP_SETTINGS.is_aws:
+            # Teed to a local copy while uploading so ingestion needn't download it back
+            spool_path = os.path.join(UPLOAD_SPOOL_FOLDER, f"{uuid4()}.{file_extension}")
 
-        session.add(kb_entry)
-        session.commit()
-        session.refresh(kb_entry)
-
-        # Process document with RAG
+        # Streamed to storage in chunks, rejected as soon as it passes the size limit
         try:
-            # For S3, we need to download the file temporarily for processing
-            if APP_SETTINGS.is_aws:
-                assert isinstance(file_storage, S3FileStorage)
-                # Download file from S3 for processing
-                import tempfile
-
-                with tempfile.NamedTemporaryFile(
-                    delete=False, suffix=f".{file_extension}"
-                ) as temp_file:
-                    temp_file_path = temp_file.name
-                    # Download from S3
-                    s3_client = file_storage.s3_client
-                    s3_client.download_file(
-                        file_storage.bucket_name,
-                        storage_info["file_path"],
-                        temp_file_path,
-                    )
-
-                    # Process the temporary file
-                    insights = rag_service.process_document(
-                        temp_file_path,
-                        file_extension,
-                        str(kb_entry.id),
-                        file.filename,
-                        current_user.id,
-                    )
-
-                    # Clean up temporary file
-                    os.unlink(temp_file_path)
-            else:
-                # For local storage, use the file path directly
-                insights = rag_service.process_document(
-                    storage_info["file_path"],
-                    file_extension,
-                    str(kb_entry.id),
-                    file.filename,
-                    current_user.id,
-                )
-
-            # Create insight entry
-            insight = KnowledgeBaseInsight(
-                knowledge_base_id=kb_entry.id,
-                summary=insights["summary"],
-                key_insights=str(insights["key_insights"]),
-                entities=str(insights.get("entities", [])),
-                topics=str(insights.get("topics", [])),
-                processed_content=insights.get("processed_content"),
-                processing_time=insights.get("processing_time"),
+            storage_info = await file_storage.save_file_async(
+                file.file,
+                file.filename,
+                file_extension,
+                max_size=MAX_FILE_SIZE,
+                spool_path=spool_path,
             )
-
-            session.add(insight)
-            kb_entry.processing_status = "completed"
-            session.commit()
-            session.refresh(insight)
-
-        except Exception as e:
-            print(f"Error processing document: {e}")
-            kb_entry.processing_status = "failed"
-            session.commit()
-
-            # Clean up uploaded file if processing failed
-            file_storage.delete_file(storage_info["file_path"])
-            raise HTTPException(status_code=500, detail=f"Error processing document: {str(e)}")
+        except FileTooLargeError:
+            raise file_too_large_error()
+
+        # Database work, copying and queueing block, so they run off the event loop
+        kb_entry = await asyncio.to_thread(
+            register_upload,
+            session,
+            current_user.id,
+            storage_info,
+            file.filename,
+            file_extension,
+            spool_path,
+        )
 
         return KnowledgeBaseResponse(
             id=str(kb_entry.id),
@@ -194,18 +363,11 @@ async def upload_file(
             file_size=kb_entry.file_size,
             upload_date=kb_entry.upload_date.isoformat(),
             processing_status=kb_entry.processing_status,
-            download_url=file_storage.get_file_url(kb_entry.file_path),
-            insight=KnowledgeBaseInsightResponse(
-                summary=insight.summary,
-                key_insights=insight.get_key_insights(),
-                entities=insight.get_entities(),
-                topics=insight.get_topics(),
-                processing_time=insight.processing_time,
-            )
-            if insight
-            else None,
+            download_url=kb_entry.get_download_url(),
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error uploading file: {str(e)}")
 
@@ -228,47 +390,37 @@ def upload_text_kb(
         file_path="",  # No file path for text
         file_type="text",
         file_size=len(payload.text.encode("utf-8")),
-        processing_status="processing",
+        processing_status="pending",
     )
     session.add(kb_record)
     session.commit()
     session.refresh(kb_record)
 
-    try:
-        # Process text using RAG
-        insights_data = rag_service.process_text(payload.text, str(kb_record.id), current_user.id)
-
-        # Create insight record
-        insight = KnowledgeBaseInsight(
-            knowledge_base_id=kb_record.id,
-            summary=insights_data["summary"],
-            key_insights=json.dumps(insights_data["key_insights"]),
-            entities=json.dumps(insights_data.get("entities", [])),
-            topics=json.dumps(insights_data.get("topics", [])),
-            processed_content=insights_data.get("processed_content", ""),
-            processing_time=insights_data.get("processing_time", 0.0),
-        )
-        session.add(insight)
-
-        # Update processing status
-        kb_record.processing_status = "completed"
-        session.commit()
-
-        return {
-            "id": str(kb_record.id),
-            "message": "Text uploaded and processed successfully",
-            "title": payload.title,
-            "size": len(payload.text.encode("utf-8")),
-            "processing_status": kb_record.processing_status,
-            "chunks_count": insights_data.get("chunks_count", 0),
-        }
-
-    except Exception as e:
-        # Cleanup on error
+    kb_id = kb_record.id
+    user_id = current_user.id
+    text = payload.text
+
+    # Chunking, embedding and insights run on the ingestion workers
+    job = IngestionJob(
+        kb_id,
+        user_id,
+        lambda report: rag_service.process_text(
+            text, str(kb_id), user_id, insight_generator.deferred
+        ),
+        on_failure=lambda: rag_service.remove_knowledge_base(str(kb_id), user_id),
+    )
+    if not ingestion_queue.submit(job):
         session.delete(kb_record)
         session.commit()
-        print(f"Error processing text: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to process text: {str(e)}")
+        raise queue_full_error()
+
+    return {
+        "id": str(kb_record.id),
+        "message": "Text uploaded, processing in background",
+        "title": payload.title,
+        "size": len(payload.text.encode("utf-8")),
+        "processing_status": kb_record.processing_status,
+    }
 
 
 @kb_router.get("/list", response_model=list[FileInfo])
@@ -301,6 +453,36 @@ def list_kb(
     return files_info
 
 
+@kb_router.get("/{kb_id}/status", response_model=KnowledgeBaseStatusResponse)
+def get_kb_status(
+    kb_id: str,
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_session),
+):
+    """Get processing status and progress of a knowledge base file"""
+    try:
+        kb_uuid = UUID(kb_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid knowledge base ID format")
+
+    statement = (
+        select(KnowledgeBase)
+        .where(KnowledgeBase.id == kb_uuid)
+        .where(KnowledgeBase.user_id == current_user.id)
+    )
+    kb_record = session.exec(statement).first()
+
+    if not kb_record:
+        raise HTTPException(status_code=404, detail="Knowledge base not found")
+
+    # Detailed progress is only known to the process running the job
+    return KnowledgeBaseStatusResponse(
+        id=str(kb_record.id),
+        processing_status=kb_record.processing_status,
+        progress=ingestion_queue.get_progress(kb_record.id),
+    )
+
+
 @kb_router.get("/{kb_id}/insight")
 def get_kb_insight(
     kb_id: str,
@@ -327,6 +509,11 @@ def get_kb_insight(
         raise HTTPException(status_code=404, detail="Insight not found")
 
     insight = kb_record.insight
+    if insight.summary is None:
+        # Deferred at upload, generated and stored on its first view
+        insight = insight_generator.generate(kb_record.id)
+        if insight is None:
+            raise HTTPException(status_code=404, detail="Insight not found")
     return KnowledgeBaseInsightResponse(
         summary=insight.summary,
         key_insights=json.loads(insight.key_insights),
@@ -348,32 +535,18 @@ async def delete_knowledge_base(
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid knowledge base ID format")
 
-    # Get knowledge base entry
-    statement = (
-        select(KnowledgeBase)
-        .where(KnowledgeBase.id == kb_uuid)
-        .where(KnowledgeBase.user_id == current_user.id)
-    )
-    kb_entry = session.exec(statement).first()
-
-    if not kb_entry:
-        raise HTTPException(status_code=404, detail="Knowledge base entry not found")
-
     try:
-        # Delete from vector store
-        rag_service.remove_knowledge_base(str(kb_entry.id), current_user.id)
-
-        # Delete file from storage
-        file_storage.delete_file(kb_entry.file_path)
-
-        # Delete from database
-        session.delete(kb_entry)
-        session.commit()
-
-        return {"message": "Knowledge base deleted successfully"}
+        # Lookup, index and file removal all block, so they run off the event loop
+        deleted = await asyncio.to_thread(
+            delete_knowledge_base_entry, session, kb_uuid, current_user.id
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error deleting knowledge base: {str(e)}")
 
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Knowledge base entry not found")
+    return {"message": "Knowledge base deleted successfully"}
+
 
 @kb_router.get("/download/{kb_id}")
 async def download_file(
@@ -403,11 +576,12 @@ async def download_file(
         assert isinstance(file_storage, S3FileStorage)
         # For S3, generate presigned URL for secure download
         try:
-            presigned_url = file_storage.get_presigned_url(kb_entry.file_path)
+            presigned_url = await file_storage.get_presigned_url_async(kb_entry.file_path)
             return RedirectResponse(url=presigned_url)
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error generating download URL: {str(e)}")
     else:
-        # For local storage, return static file URL
-        download_url = file_storage.get_file_url(kb_entry.file_path)
-        return RedirectResponse(url=download_url)
+        # Local files are outside the static mount, so they are only readable from here
+        if not await file_storage.file_exists_async(kb_entry.file_path):
+            raise HTTPException(status_code=404, detail="File not found")
+        return FileResponse(kb_entry.file_path, filename=kb_entry.original_filename)
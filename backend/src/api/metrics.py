@@ -3,6 +3,13 @@ import shutil
 import psutil
 from fastapi import APIRouter
 
+from src.core.embedding_cache import embedding_cache, query_embedding_cache
+from src.core.embedding_service import embedding_service
+from src.core.embeddings import embedding_registry
+from src.core.ingestion import ingestion_queue
+from src.core.insights import insight_generator
+from src.core.vector_store import vector_store_cache
+
 metrics_router = APIRouter(prefix="/metrics", tags=["Metrics"])
 
 
@@ -26,3 +33,51 @@ def health_check():
             "percent": round(disk.used / disk.total * 100, 2),
         },
     }
+
+
+@metrics_router.get("/embeddings", summary="Embedding Models")
+def embedding_models():
+    """Load time and resident memory of embedding models loaded in this process"""
+    return {"models": embedding_registry.get_stats()}
+
+
+@metrics_router.get("/embedding-service", summary="Embedding Service")
+def embedding_service_stats():
+    """Requests and batch sizes of the micro-batching embedding service"""
+    return {"models": embedding_service.get_stats()}
+
+
+@metrics_router.get("/vector-store-cache", summary="Vector Store Cache")
+def vector_store_cache_stats():
+    """Hit/miss/eviction counters of the in-process vector store cache"""
+    return vector_store_cache.get_stats()
+
+
+@metrics_router.get("/vector-index", summary="Vector Indexes")
+def vector_index_stats():
+    """Index type, size and promotion recall/latency of cached vector stores"""
+    return {"stores": vector_store_cache.get_index_stats()}
+
+
+@metrics_router.get("/embedding-cache", summary="Embedding Cache")
+def embedding_cache_stats():
+    """Hit/miss/eviction counters of the persistent chunk embedding cache"""
+    return embedding_cache.get_stats()
+
+
+@metrics_router.get("/query-embedding-cache", summary="Query Embedding Cache")
+def query_embedding_cache_stats():
+    """Hit/miss/expiration counters of the in-process query embedding cache"""
+    return query_embedding_cache.get_stats()
+
+
+@metrics_router.get("/ingestion", summary="Ingestion Queue")
+def ingestion_queue_stats():
+    """Depth, running jobs and outcomes of the background ingestion queue"""
+    return ingestion_queue.get_stats()
+
+
+@metrics_router.get("/insights", summary="Deferred Insights")
+def insight_generator_stats():
+    """Mode and counts of insights generated after upload"""
+    return insight_generator.get_stats()
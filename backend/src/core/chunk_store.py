@@ -0,0 +1,245 @@
+import re
+import sqlite3
+import threading
+from typing import Any, Optional
+
+import numpy as np
+
+
+class ChunkStore:
+    """Append-only SQLite store of chunk metadata keyed by vector id"""
+
+    COLUMNS = ("vector_id", "kb_id", "filename", "chunk_index", "text")
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        # WAL lets searches in other workers read while an upload is appending
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                vector_id INTEGER PRIMARY KEY,
+                kb_id TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                chunk_index INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                embedding BLOB,
+                user_id TEXT
+            )
+            """
+        )
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(chunks)")}
+        if "embedding" not in columns:
+            # Stores created before full-precision vectors were kept alongside the text
+            self.conn.execute("ALTER TABLE chunks ADD COLUMN embedding BLOB")
+        if "user_id" not in columns:
+            # Only rows of shared stores are tagged, per-user stores leave it empty
+            self.conn.execute("ALTER TABLE chunks ADD COLUMN user_id TEXT")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS ix_chunks_kb_id ON chunks (kb_id)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS ix_chunks_user_id ON chunks (user_id)")
+        self.conn.commit()
+        self.fts_enabled = self._create_fts_index()
+
+    def _create_fts_index(self) -> bool:
+        """Full-text index over chunk text kept in sync by triggers, False without FTS5"""
+        exists = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chunks_fts'"
+        ).fetchone()
+        if exists:
+            return True
+        try:
+            with self.conn:
+                # Underscores are part of tokens so identifiers like t24_customer__s2 stay whole
+                self.conn.execute(
+                    "CREATE VIRTUAL TABLE chunks_fts USING fts5("
+                    "text, content='chunks', content_rowid='vector_id', "
+                    "tokenize=\"unicode61 remove_diacritics 2 tokenchars '_'\")"
+                )
+                self.conn.execute(
+                    "CREATE TRIGGER IF NOT EXISTS chunks_fts_insert AFTER INSERT ON chunks BEGIN "
+                    "INSERT INTO chunks_fts (rowid, text) VALUES (new.vector_id, new.text); END"
+                )
+                self.conn.execute(
+                    "CREATE TRIGGER IF NOT EXISTS chunks_fts_delete AFTER DELETE ON chunks BEGIN "
+                    "INSERT INTO chunks_fts (chunks_fts, rowid, text) "
+                    "VALUES ('delete', old.vector_id, old.text); END"
+                )
+                # Index rows of stores created before the full-text index existed
+                self.conn.execute("INSERT INTO chunks_fts (chunks_fts) VALUES ('rebuild')")
+        except sqlite3.OperationalError as e:
+            print(f"Full-text search unavailable, keyword retrieval disabled: {e}")
+            return False
+        return True
+
+    def add_chunks(self, chunks: list[dict[str, Any]], embeddings: Optional[np.ndarray] = None):
+        """Append chunk rows, cost is proportional to the number of new chunks"""
+        if not chunks:
+            return
+        rows = [
+            {
+                "user_id": None,
+                **chunk,
+                "embedding": embeddings[i].astype("float32").tobytes()
+                if embeddings is not None
+                else None,
+            }
+            for i, chunk in enumerate(chunks)
+        ]
+        with self._lock:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT INTO chunks "
+                    "(vector_id, kb_id, filename, chunk_index, text, embedding, user_id) VALUES "
+                    "(:vector_id, :kb_id, :filename, :chunk_index, :text, :embedding, :user_id)",
+                    rows,
+                )
+
+    def get_embeddings(
+        self, vector_ids: Optional[list[int]] = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Stored full-precision vectors as (ids, vectors), rows without a vector are skipped"""
+        with self._lock:
+            if vector_ids is None:
+                rows = self.conn.execute(
+                    "SELECT vector_id, embedding FROM chunks WHERE embedding IS NOT NULL "
+                    "ORDER BY vector_id"
+                ).fetchall()
+            else:
+                rows = []
+                ids = [int(vector_id) for vector_id in vector_ids]
+                # Stay below SQLite's bound parameter limit
+                for start in range(0, len(ids), 900):
+                    batch = ids[start : start + 900]
+                    placeholders = ",".join("?" for _ in batch)
+                    rows.extend(
+                        self.conn.execute(
+                            "SELECT vector_id, embedding FROM chunks "
+                            f"WHERE embedding IS NOT NULL AND vector_id IN ({placeholders})",
+                            batch,
+                        ).fetchall()
+                    )
+        if not rows:
+            return np.empty(0, dtype="int64"), np.empty((0, 0), dtype="float32")
+        ids = np.array([row[0] for row in rows], dtype="int64")
+        vectors = np.vstack([np.frombuffer(row[1], dtype="float32") for row in rows])
+        return ids, vectors
+
+    def set_embeddings(self, vector_ids: np.ndarray, embeddings: np.ndarray):
+        """Backfill full-precision vectors for existing rows"""
+        with self._lock:
+            with self.conn:
+                self.conn.executemany(
+                    "UPDATE chunks SET embedding = ? WHERE vector_id = ?",
+                    [
+                        (embeddings[i].astype("float32").tobytes(), int(vector_id))
+                        for i, vector_id in enumerate(vector_ids)
+                    ],
+                )
+
+    def count_missing_embeddings(self) -> int:
+        """Number of rows without a stored full-precision vector"""
+        with self._lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM chunks WHERE embedding IS NULL"
+            ).fetchone()[0]
+
+    def get_chunks(self, vector_ids: list[int]) -> dict[int, dict[str, Any]]:
+        """Materialize only the requested rows, keyed by vector id"""
+        if not vector_ids:
+            return {}
+        placeholders = ",".join("?" for _ in vector_ids)
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM chunks WHERE vector_id IN ({placeholders})",
+                [int(vector_id) for vector_id in vector_ids],
+            ).fetchall()
+        return {row["vector_id"]: dict(row) for row in rows}
+
+    def keyword_search(
+        self, query: str, k: int, user_id: Optional[str] = None
+    ) -> list[tuple[int, float]]:
+        """BM25-ranked (vector_id, score) pairs matching any term of the query, best first
+
+        In a shared store only rows tagged with the given user are matched.
+        """
+        terms = re.findall(r"\w+", query.lower())
+        if not self.fts_enabled or not terms:
+            return []
+        # Quoted terms so FTS5 operators and punctuation in questions are taken literally
+        match = " OR ".join(f'"{term}"' for term in dict.fromkeys(terms))
+        with self._lock:
+            if user_id is None:
+                rows = self.conn.execute(
+                    "SELECT rowid, bm25(chunks_fts) FROM chunks_fts WHERE chunks_fts MATCH ? "
+                    "ORDER BY bm25(chunks_fts) LIMIT ?",
+                    (match, k),
+                ).fetchall()
+            else:
+                rows = self.conn.execute(
+                    "SELECT chunks_fts.rowid, bm25(chunks_fts) FROM chunks_fts "
+                    "JOIN chunks ON chunks.vector_id = chunks_fts.rowid "
+                    "WHERE chunks_fts MATCH ? AND chunks.user_id = ? "
+                    "ORDER BY bm25(chunks_fts) LIMIT ?",
+                    (match, user_id, k),
+                ).fetchall()
+        # bm25() is lower for better matches, flip it so higher is better
+        return [(row[0], -row[1]) for row in rows]
+
+    def get_vector_ids(self, kb_id: str, user_id: Optional[str] = None) -> list[int]:
+        """Vector ids belonging to a knowledge base, of the given user in a shared store"""
+        with self._lock:
+            if user_id is None:
+                rows = self.conn.execute(
+                    "SELECT vector_id FROM chunks WHERE kb_id = ?", (kb_id,)
+                ).fetchall()
+            else:
+                rows = self.conn.execute(
+                    "SELECT vector_id FROM chunks WHERE kb_id = ? AND user_id = ?",
+                    (kb_id, user_id),
+                ).fetchall()
+        return [row[0] for row in rows]
+
+    def get_user_vector_ids(self, user_id: str) -> np.ndarray:
+        """Vector ids of every row tagged with a user"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT vector_id FROM chunks WHERE user_id = ?", (user_id,)
+            ).fetchall()
+        return np.array([row[0] for row in rows], dtype="int64")
+
+    def get_kb_ids(self) -> list[str]:
+        """Knowledge bases with rows in the store"""
+        with self._lock:
+            rows = self.conn.execute("SELECT DISTINCT kb_id FROM chunks").fetchall()
+        return [row[0] for row in rows]
+
+    def delete_kb(self, kb_id: str, user_id: Optional[str] = None) -> int:
+        """Delete all rows of a knowledge base, return the number of deleted rows"""
+        with self._lock:
+            with self.conn:
+                if user_id is None:
+                    cursor = self.conn.execute("DELETE FROM chunks WHERE kb_id = ?", (kb_id,))
+                else:
+                    cursor = self.conn.execute(
+                        "DELETE FROM chunks WHERE kb_id = ? AND user_id = ?", (kb_id, user_id)
+                    )
+        return cursor.rowcount
+
+    def next_vector_id(self) -> int:
+        """Next unused vector id"""
+        with self._lock:
+            row = self.conn.execute("SELECT MAX(vector_id) FROM chunks").fetchone()
+        return 0 if row[0] is None else row[0] + 1
+
+    def count(self) -> int:
+        """Number of stored chunks"""
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,236 @@
+import multiprocessing
+import queue
+import resource
+import threading
+import time
+from typing import Iterator
+
+from PyPDF2 import PdfReader
+
+from src.core.document_profiling import ExcelProfiler, StreamingCSVProfiler
+from src.core.settings import (
+    PARSER_MEMORY_LIMIT_MB,
+    PARSER_QUEUE_PAGES,
+    PARSER_RECYCLE_FILES,
+    PARSER_TIMEOUT_SECONDS,
+    PARSER_WORKERS,
+)
+
+PARSED_FILE_TYPES = ("pdf", "csv", "xlsx", "xls")
+
+# How often the parent checks that a silent parser process is still alive
+_POLL_SECONDS = 1.0
+
+
+def extract_pages(file_path: str, file_type: str) -> Iterator[str]:
+    """Text of a document piece by piece, PDF pages or the profile of a table"""
+    if file_type == "pdf":
+        try:
+            reader = PdfReader(file_path)
+            for page in reader.pages:
+                yield page.extract_text() or ""
+        except Exception as e:
+            raise Exception(f"Error processing PDF: {str(e)}")
+    elif file_type == "csv":
+        try:
+            # Profiled in chunks so large exports don't have to fit in memory
+            yield StreamingCSVProfiler().profile(file_path)
+        except Exception as e:
+            raise Exception(f"Error processing CSV: {str(e)}")
+    elif file_type in ["xlsx", "xls"]:
+        try:
+            # Only the header and sample rows of each sheet are parsed
+            yield ExcelProfiler().profile(file_path)
+        except Exception as e:
+            raise Exception(f"Error processing Excel: {str(e)}")
+    else:
+        raise ValueError(f"Unsupported file type: {file_type}")
+
+
+def _caused_by_memory_error(error: BaseException) -> bool:
+    # extract_pages re-raises parser errors as plain exceptions
+    while error is not None:
+        if isinstance(error, MemoryError):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def _parser_worker(
+    tasks: multiprocessing.Queue, pages: multiprocessing.Queue, memory_limit_mb: int
+):
+    """Entry point of a parser process, parses the files sent on `tasks` until it gets None
+
+    Each file's pages are sent as ("page", text) messages followed by ("done", None)
+    or ("error", message). A file that hits the memory limit is answered with
+    ("fatal", message) instead and the process exits, its heap can't be trusted.
+    """
+    if memory_limit_mb > 0:
+        limit = memory_limit_mb * 1024 * 1024
+        # Allocations past the limit fail with MemoryError instead of starving the host
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        file_path, file_type = task
+        try:
+            for page in extract_pages(file_path, file_type):
+                pages.put(("page", page))
+            pages.put(("done", None))
+        except Exception as e:
+            if _caused_by_memory_error(e):
+                pages.put(("fatal", f"Parsing exceeded the {memory_limit_mb}MB memory limit"))
+                return
+            pages.put(("error", str(e)))
+
+
+class _ParserWorker:
+    """A long-lived parser process with its task and page queues"""
+
+    def __init__(self, context, memory_limit_mb: int, queue_pages: int):
+        self.tasks = context.Queue()
+        self.pages = context.Queue(maxsize=queue_pages)
+        self.process = context.Process(
+            target=_parser_worker,
+            args=(self.tasks, self.pages, memory_limit_mb),
+            name="document-parser",
+            daemon=True,
+        )
+        self.process.start()
+        self.files = 0
+
+    def stop(self, kill: bool):
+        """Ends the process, killing it if it may still be busy"""
+        if kill:
+            if self.process.is_alive():
+                self.process.kill()
+            self.process.join()
+            self.tasks.cancel_join_thread()
+        else:
+            # An idle worker finishes its loop, the process is reaped by the next start()
+            self.tasks.put(None)
+        self.tasks.close()
+        self.pages.close()
+        self.pages.cancel_join_thread()
+
+
+class DocumentParserPool:
+    """Runs CPU-heavy document parsing in separate processes off the API's GIL
+
+    Worker processes are started on demand and kept between files, spawning one
+    costs 1-2s, more than parsing most documents. A worker is replaced after
+    `recycle_files` files, after hitting the memory limit, and whenever a file
+    doesn't finish cleanly. A lower `recycle_files` bounds leaks and state kept
+    between users' files at the cost of more process starts, 1 gives every file a
+    fresh process. At most `workers` parse at once, a parse is killed once it runs
+    past the timeout, and pages stream back through a bounded queue as they are
+    extracted.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        timeout: float,
+        memory_limit_mb: int,
+        queue_pages: int,
+        recycle_files: int,
+    ):
+        self.workers = workers
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.queue_pages = queue_pages
+        self.recycle_files = max(recycle_files, 1)
+        # Spawn rather than fork, forking a process with running threads can deadlock
+        self._context = multiprocessing.get_context("spawn")
+        self._slots = threading.BoundedSemaphore(max(workers, 1))
+        self._idle: list[_ParserWorker] = []
+        self._idle_lock = threading.Lock()
+
+        self.started = 0
+        self.recycled = 0
+
+    def iter_pages(self, file_path: str, file_type: str) -> Iterator[str]:
+        """Extracted text pieces of a document, parsed in a worker process"""
+        if file_type not in PARSED_FILE_TYPES:
+            raise ValueError(f"Unsupported file type: {file_type}")
+        if self.workers <= 0:
+            # Parsing in process, meant for debugging
+            yield from extract_pages(file_path, file_type)
+            return
+
+        with self._slots:
+            worker = self._checkout()
+            worker.tasks.put((file_path, file_type))
+            worker.files += 1
+            # Stays False when the worker may still be mid-file, it is killed then
+            reusable = False
+            # Only time spent waiting on the parser counts, not time the consumer is busy
+            budget = self.timeout
+            try:
+                while True:
+                    started = time.monotonic()
+                    kind, payload = self._next_message(worker.process, worker.pages, budget)
+                    budget -= time.monotonic() - started
+                    if kind == "done":
+                        reusable = True
+                        break
+                    if kind == "error":
+                        reusable = True
+                        raise Exception(payload)
+                    if kind == "fatal":
+                        raise Exception(payload)
+                    yield payload
+            finally:
+                # Also reached when the consumer stops early or fails
+                self._release(worker, reusable)
+
+    def _checkout(self) -> _ParserWorker:
+        with self._idle_lock:
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.process.is_alive():
+                    return worker
+                worker.stop(kill=True)
+            self.started += 1
+        return _ParserWorker(self._context, self.memory_limit_mb, self.queue_pages)
+
+    def _release(self, worker: _ParserWorker, reusable: bool):
+        if reusable and worker.files < self.recycle_files and worker.process.is_alive():
+            with self._idle_lock:
+                self._idle.append(worker)
+            return
+        with self._idle_lock:
+            self.recycled += 1
+        worker.stop(kill=not reusable)
+
+    def _next_message(
+        self, process: multiprocessing.Process, pages: multiprocessing.Queue, budget: float
+    ) -> tuple[str, str]:
+        deadline = time.monotonic() + budget
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"Parsing took longer than {self.timeout:g} seconds")
+            try:
+                return pages.get(timeout=min(remaining, _POLL_SECONDS))
+            except queue.Empty:
+                if process.is_alive():
+                    continue
+            # The process may have exited right after its last message was sent
+            try:
+                return pages.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                raise Exception(
+                    f"Parser process exited unexpectedly (exit code {process.exitcode})"
+                )
+
+
+# Global document parser pool instance
+document_parser = DocumentParserPool(
+    PARSER_WORKERS,
+    PARSER_TIMEOUT_SECONDS,
+    PARSER_MEMORY_LIMIT_MB,
+    PARSER_QUEUE_PAGES,
+    PARSER_RECYCLE_FILES,
+)
@@ -0,0 +1,291 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Hashable, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.core.settings import (
+    CSV_PROFILE_CHUNK_ROWS,
+    CSV_PROFILE_SAMPLE_SIZE,
+    CSV_PROFILE_TOP_K_CAPACITY,
+    EXCEL_SAMPLE_ROWS,
+    EXCEL_SHEET_WORKERS,
+)
+
+
+class RunningNumericStats:
+    """Mergeable count/mean/std/min/max plus a reservoir sample for approximate quantiles"""
+
+    def __init__(self, sample_size: int, seed: int = 0):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.nan
+        self.max = np.nan
+        self.sample_size = sample_size
+        self.sample = np.empty(0, dtype="float64")
+        self._seen = 0
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, series: pd.Series):
+        values = series.dropna().to_numpy(dtype="float64")
+        if len(values) == 0:
+            return
+
+        # Chan et al. parallel update of mean and sum of squared deviations
+        n_b = len(values)
+        mean_b = values.mean()
+        m2_b = ((values - mean_b) ** 2).sum()
+        n = self.count + n_b
+        delta = mean_b - self.mean
+        self.mean += delta * n_b / n
+        self.m2 += m2_b + delta**2 * self.count * n_b / n
+        self.count = n
+
+        self.min = np.nanmin([self.min, values.min()])
+        self.max = np.nanmax([self.max, values.max()])
+
+        self._update_sample(values)
+
+    def _update_sample(self, values: np.ndarray):
+        """Reservoir sampling, exact while fewer than sample_size values were seen"""
+        room = self.sample_size - len(self.sample)
+        if room > 0:
+            self.sample = np.concatenate([self.sample, values[:room]])
+            self._seen += min(room, len(values))
+            values = values[room:]
+        if len(values) == 0:
+            return
+        positions = self._seen + np.arange(len(values))
+        slots = self._rng.integers(0, positions + 1)
+        keep = slots < self.sample_size
+        self.sample[slots[keep]] = values[keep]
+        self._seen += len(values)
+
+    def describe(self) -> list[float]:
+        """Values in the order of DataFrame.describe(): count, mean, std, min, quartiles, max"""
+        if self.count == 0:
+            return [0.0] + [np.nan] * 7
+        std = np.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.nan
+        quartiles = np.quantile(self.sample, [0.25, 0.5, 0.75])
+        return [float(self.count), self.mean, std, self.min, *quartiles, self.max]
+
+
+class TopKCounter:
+    """Bounded frequency summary, exact while the number of distinct values fits the capacity"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counts: dict[Hashable, int] = {}
+        # Upper bound of the count of any value that was evicted from the summary
+        self.floor = 0
+
+    def update(self, series: pd.Series):
+        for value, count in series.value_counts().items():
+            self.counts[value] = self.counts.get(value, self.floor) + int(count)
+        if len(self.counts) > self.capacity:
+            ordered = sorted(self.counts.items(), key=lambda item: item[1], reverse=True)
+            self.floor = ordered[self.capacity][1]
+            self.counts = dict(ordered[: self.capacity])
+
+    def top(self, n: int) -> list[tuple[Hashable, int]]:
+        return sorted(self.counts.items(), key=lambda item: item[1], reverse=True)[:n]
+
+
+class StreamingCSVProfiler:
+    """Profiles a CSV chunk by chunk so memory stays constant regardless of file size"""
+
+    def __init__(
+        self,
+        chunk_rows: int = CSV_PROFILE_CHUNK_ROWS,
+        sample_size: int = CSV_PROFILE_SAMPLE_SIZE,
+        top_k_capacity: int = CSV_PROFILE_TOP_K_CAPACITY,
+    ):
+        self.chunk_rows = chunk_rows
+        self.sample_size = sample_size
+        self.top_k_capacity = top_k_capacity
+
+    def profile(self, file_path: str) -> str:
+        """Describe a CSV in the same text format as a full pandas read"""
+        rows = 0
+        head: Optional[pd.DataFrame] = None
+        columns: list[str] = []
+        numeric: dict[str, RunningNumericStats] = {}
+        categorical: dict[str, TopKCounter] = {}
+        non_numeric: set[str] = set()
+        # Columns with chunks that were not parsed as text, their values are missing from
+        # the counts if the column ends up typed as object
+        uncounted: set[str] = set()
+
+        for chunk in pd.read_csv(file_path, chunksize=self.chunk_rows):
+            if head is None:
+                head = chunk.head()
+                columns = chunk.columns.tolist()
+            elif len(head) < 5:
+                # Chunks smaller than the sample still show as many rows as a full read
+                head = pd.concat([head, chunk.head(5 - len(head))])
+            rows += len(chunk)
+
+            for col in columns:
+                series = chunk[col]
+                if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+                    uncounted.add(col)
+                    if col not in non_numeric:
+                        numeric.setdefault(col, RunningNumericStats(self.sample_size)).update(
+                            series
+                        )
+                    continue
+
+                # A full read would type the whole column as object once any chunk is not
+                # numeric, so its numeric stats are dropped
+                if col in numeric:
+                    del numeric[col]
+                non_numeric.add(col)
+                if pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+                    categorical.setdefault(col, TopKCounter(self.top_k_capacity)).update(series)
+                else:
+                    uncounted.add(col)
+
+        if head is None:
+            # Header only, no data rows
+            head = pd.read_csv(file_path, nrows=0)
+            columns = head.columns.tolist()
+
+        # Mixed columns are shown and counted again as text, counting only those printed
+        retyped = [col for col in columns if col in non_numeric and col in uncounted]
+        if retyped:
+            head = pd.read_csv(file_path, nrows=len(head), dtype={col: str for col in retyped})
+        recount = [col for col in columns if col in categorical][:3]
+        recount = [col for col in recount if col in uncounted]
+        if recount:
+            categorical.update(self._count_as_text(file_path, recount))
+
+        return self._format(rows, columns, head, numeric, categorical)
+
+    def _count_as_text(self, file_path: str, columns: list[str]) -> dict[str, TopKCounter]:
+        """Value counts of columns read as raw text, as a full read types mixed columns"""
+        counters = {col: TopKCounter(self.top_k_capacity) for col in columns}
+        for chunk in pd.read_csv(file_path, usecols=columns, dtype=str, chunksize=self.chunk_rows):
+            for col in columns:
+                counters[col].update(chunk[col])
+        return counters
+
+    @staticmethod
+    def _format(
+        rows: int,
+        columns: list[str],
+        head: pd.DataFrame,
+        numeric: dict[str, RunningNumericStats],
+        categorical: dict[str, TopKCounter],
+    ) -> str:
+        # Convert statistics to descriptive text
+        text = f"Dataset with {rows} rows and {len(columns)} columns.\n"
+        text += f"Columns: {', '.join(str(col) for col in columns)}\n\n"
+
+        # Add sample data and statistics
+        text += "Sample data:\n"
+        text += head.to_string() + "\n\n"
+
+        # Add basic statistics for numeric columns
+        numeric_cols = [col for col in columns if col in numeric]
+        if numeric_cols:
+            summary = pd.DataFrame(
+                {col: numeric[col].describe() for col in numeric_cols},
+                index=["count", "mean", "std", "min", "25%", "50%", "75%", "max"],
+            )
+            text += "Statistical summary for numeric columns:\n"
+            text += summary.to_string() + "\n\n"
+
+        # Add value counts for categorical columns
+        categorical_cols = [col for col in columns if col in categorical]
+        for col in categorical_cols[:3]:  # Limit to first 3 categorical columns
+            top_values: Any = categorical[col].top(5)
+            counts = pd.Series(
+                [count for _, count in top_values],
+                index=pd.Index([value for value, _ in top_values], name=col),
+                name="count",
+            )
+            text += f"Value counts for {col}:\n"
+            text += counts.to_string() + "\n\n"
+
+        return text.strip()
+
+
+class ExcelProfiler:
+    """Describes every sheet of a workbook from its header and first rows only"""
+
+    def __init__(
+        self, sample_rows: int = EXCEL_SAMPLE_ROWS, max_workers: int = EXCEL_SHEET_WORKERS
+    ):
+        self.sample_rows = sample_rows
+        self.max_workers = max_workers
+
+    def profile(self, file_path: str) -> str:
+        """Describe a workbook in the same text format as reading every sheet with pandas"""
+        # The workbook is opened once, xlsx files in openpyxl's streaming read-only mode
+        with pd.ExcelFile(file_path) as excel_file:
+            sheet_names = excel_file.sheet_names
+            workers = min(self.max_workers, len(sheet_names))
+            if workers <= 1:
+                sections = self._describe_sheets(excel_file, sheet_names)
+
+        if workers > 1:
+            sections = {}
+            groups = [sheet_names[i::workers] for i in range(workers)]
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for result in executor.map(
+                    self._describe_sheet_group, [file_path] * workers, groups
+                ):
+                    sections.update(result)
+
+        text = f"Excel file with {len(sheet_names)} sheet(s): {', '.join(sheet_names)}\n\n"
+        text += "".join(sections[sheet_name] for sheet_name in sheet_names)
+        return text.strip()
+
+    def _describe_sheet_group(self, file_path: str, sheet_names: list[str]) -> dict[str, str]:
+        # Read-only workbooks are not thread safe, every worker opens its own handle
+        with pd.ExcelFile(file_path) as excel_file:
+            return self._describe_sheets(excel_file, sheet_names)
+
+    def _describe_sheets(self, excel_file: pd.ExcelFile, sheet_names: list[str]) -> dict[str, str]:
+        sections = {}
+        for sheet_name in sheet_names:
+            # Counted first, parsing resets the dimensions of read-only worksheets
+            row_count = self._count_rows(excel_file, sheet_name)
+            df = excel_file.parse(sheet_name, nrows=self.sample_rows)
+            if row_count is None:
+                row_count = len(excel_file.parse(sheet_name))
+
+            text = f"Sheet: {sheet_name}\n"
+            text += f"Size: {row_count} rows, {len(df.columns)} columns\n"
+            text += f"Columns: {', '.join(str(col) for col in df.columns)}\n"
+            text += "Sample data:\n"
+            text += df.to_string() + "\n\n"
+            sections[sheet_name] = text
+        return sections
+
+    @staticmethod
+    def _count_rows(excel_file: pd.ExcelFile, sheet_name: str) -> Optional[int]:
+        """Data rows below the header without loading them, None if the engine can't tell
+
+        Like pandas, the first row is the header even when blank, blank rows in
+        between count and trailing ones are dropped, styled or not.
+        """
+        if excel_file.engine == "openpyxl":
+            worksheet = excel_file.book[sheet_name]
+            # The dimension record also covers formatted empty cells, so rows are
+            # streamed without materializing them
+            last_row = 0
+            for row_number, row in enumerate(worksheet.iter_rows(values_only=True), start=1):
+                if any(value is not None for value in row):
+                    last_row = row_number
+            return max(last_row - 1, 0)
+        if excel_file.engine == "xlrd":
+            sheet = excel_file.book.sheet_by_name(sheet_name)
+            last_row = 0
+            for row_number in range(sheet.nrows, 0, -1):
+                if any(value != "" for value in sheet.row_values(row_number - 1)):
+                    last_row = row_number
+                    break
+            return max(last_row - 1, 0)
+        return None
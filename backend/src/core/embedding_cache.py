@@ -0,0 +1,216 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable
+
+import numpy as np
+
+from src.core.settings import (
+    EMBEDDING_CACHE_MAX_ENTRIES,
+    EMBEDDING_CACHE_PATH,
+    QUERY_EMBEDDING_CACHE_MAX_ENTRIES,
+    QUERY_EMBEDDING_CACHE_TTL,
+)
+
+
+class EmbeddingCache:
+    """Persistent cache of chunk embeddings keyed by model name and content hash"""
+
+    def __init__(self, db_path: str, max_entries: int):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model_name TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model_name, text_hash)
+            )
+            """
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_embeddings_last_used ON embeddings (last_used)"
+        )
+        self.conn.commit()
+        # Approximate, other workers insert into the same file
+        self._entries = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def hash_text(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def encode(
+        self, model_name: str, texts: list[str], encode_fn: Callable[[list[str]], Any]
+    ) -> np.ndarray:
+        """Embed texts, running the model only on texts that were never embedded before"""
+        hashes = [self.hash_text(text) for text in texts]
+        cached = self._get_many(model_name, list(set(hashes)))
+
+        # Identical chunks within the same batch are encoded only once
+        missing: dict[str, str] = {}
+        for text_hash, text in zip(hashes, texts):
+            if text_hash not in cached and text_hash not in missing:
+                missing[text_hash] = text
+
+        if missing:
+            encoded = np.array(encode_fn(list(missing.values()))).astype("float32")
+            new_entries = dict(zip(missing.keys(), encoded))
+            self._put_many(model_name, new_entries)
+            cached.update(new_entries)
+
+        with self._lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+
+        return np.vstack([cached[text_hash] for text_hash in hashes]).astype("float32")
+
+    def _get_many(self, model_name: str, hashes: list[str]) -> dict[str, np.ndarray]:
+        found: dict[str, np.ndarray] = {}
+        now = time.time()
+        with self._lock:
+            # Stay below SQLite's bound parameter limit
+            for start in range(0, len(hashes), 900):
+                batch = hashes[start : start + 900]
+                placeholders = ",".join("?" for _ in batch)
+                rows = self.conn.execute(
+                    "SELECT text_hash, embedding FROM embeddings "
+                    f"WHERE model_name = ? AND text_hash IN ({placeholders})",
+                    [model_name, *batch],
+                ).fetchall()
+                for text_hash, embedding in rows:
+                    found[text_hash] = np.frombuffer(embedding, dtype="float32")
+            if found:
+                with self.conn:
+                    self.conn.executemany(
+                        "UPDATE embeddings SET last_used = ? "
+                        "WHERE model_name = ? AND text_hash = ?",
+                        [(now, model_name, text_hash) for text_hash in found],
+                    )
+        return found
+
+    def _put_many(self, model_name: str, entries: dict[str, np.ndarray]):
+        now = time.time()
+        with self._lock:
+            with self.conn:
+                cursor = self.conn.executemany(
+                    "INSERT OR IGNORE INTO embeddings (model_name, text_hash, embedding, last_used) "
+                    "VALUES (?, ?, ?, ?)",
+                    [
+                        (model_name, text_hash, embedding.tobytes(), now)
+                        for text_hash, embedding in entries.items()
+                    ],
+                )
+            self._entries += max(cursor.rowcount, 0)
+            if self._entries > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries down to 90% of the limit, caller holds the lock"""
+        self._entries = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = self._entries - int(self.max_entries * 0.9)
+        if excess <= 0:
+            return
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM embeddings WHERE rowid IN "
+                "(SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+        self._entries -= excess
+        self.evictions += excess
+
+    def get_stats(self) -> dict[str, Any]:
+        """Hit/miss/eviction counters and number of cached embeddings"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": self._entries,
+                "max_entries": self.max_entries,
+            }
+
+
+class QueryEmbeddingCache:
+    """In-process LRU cache of query embeddings shared by all users, entries expire after a TTL"""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple[str, str], tuple[np.ndarray, float]] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Canonical form of a query, so spacing and unicode composition don't split entries"""
+        return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+    def encode(
+        self, model_name: str, text: str, encode_fn: Callable[[list[str]], Any]
+    ) -> np.ndarray:
+        """Embedding of a single query, running the model only on a miss"""
+        query = self.normalize(text)
+        key = (model_name, query)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[1] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+
+        embedding = np.array(encode_fn([query])).astype("float32")[0]
+        # Results are shared, callers must not modify them in place
+        embedding.setflags(write=False)
+
+        with self._lock:
+            self._entries[key] = (embedding, now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return embedding
+
+    def get_stats(self) -> dict[str, Any]:
+        """Hit/miss/expiration/eviction counters and number of cached queries"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "expirations": self.expirations,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+            }
+
+
+# Global embedding cache instances
+embedding_cache = EmbeddingCache(EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES)
+query_embedding_cache = QueryEmbeddingCache(
+    QUERY_EMBEDDING_CACHE_MAX_ENTRIES, QUERY_EMBEDDING_CACHE_TTL
+)
@@ -0,0 +1,163 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+from src.core.embeddings import embedding_registry
+from src.core.settings import EMBEDDING_MICRO_BATCH_MAX_SIZE, EMBEDDING_MICRO_BATCH_MAX_WAIT_MS
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent encode requests for one model into batched model runs
+
+    A single worker thread takes the first waiting request, gathers the requests
+    arriving within the wait window up to the batch size and encodes them together.
+    """
+
+    def __init__(
+        self, model_name: str, device: Optional[str], max_batch_size: int, max_wait: float
+    ):
+        self.model_name = model_name
+        self.device = device
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self._queue: queue.Queue[tuple[list[str], Future]] = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+        self.requests = 0
+        self.batches = 0
+        self.texts = 0
+        self.largest_batch = 0
+
+    def submit(self, texts: list[str]) -> Future:
+        """Queue texts for encoding, the future resolves to one float32 row per text"""
+        future: Future = Future()
+        with self._lock:
+            self.requests += 1
+        if len(texts) >= self.max_batch_size:
+            # Already a full batch, nothing to gain from waiting for others
+            self._run([(texts, future)])
+            return future
+
+        with self._lock:
+            if self._thread is None:
+                # Started lazily so importing the module doesn't spawn threads
+                self._thread = threading.Thread(
+                    target=self._worker, name=f"embedding-batcher-{self.model_name}", daemon=True
+                )
+                self._thread.start()
+        self._queue.put((texts, future))
+        return future
+
+    def _worker(self):
+        while True:
+            batch = [self._queue.get()]
+            size = len(batch[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(request)
+                size += len(request[0])
+            self._run(batch)
+
+    def _run(self, batch: list[tuple[list[str], Future]]):
+        """Encode the texts of several requests in one model call and split the result"""
+        batch = [
+            (texts, future) for texts, future in batch if future.set_running_or_notify_cancel()
+        ]
+        texts = [text for request_texts, _ in batch for text in request_texts]
+        if not texts:
+            for _, future in batch:
+                future.set_result(np.empty((0, 0), dtype="float32"))
+            return
+
+        try:
+            model = embedding_registry.get_model(self.model_name, device=self.device)
+            embeddings = np.asarray(
+                model.encode(texts, batch_size=min(len(texts), self.max_batch_size)),
+                dtype="float32",
+            )
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        with self._lock:
+            self.batches += 1
+            self.texts += len(texts)
+            self.largest_batch = max(self.largest_batch, len(texts))
+
+        start = 0
+        for request_texts, future in batch:
+            future.set_result(embeddings[start : start + len(request_texts)])
+            start += len(request_texts)
+
+    def get_stats(self) -> dict[str, Any]:
+        """Requests, model runs and average texts per run"""
+        with self._lock:
+            return {
+                "model_name": self.model_name,
+                "device": self.device or "auto",
+                "requests": self.requests,
+                "batches": self.batches,
+                "texts": self.texts,
+                "avg_batch_size": round(self.texts / self.batches, 2) if self.batches else 0,
+                "largest_batch": self.largest_batch,
+                "pending": self._queue.qsize(),
+            }
+
+
+class EmbeddingService:
+    """Micro-batching front of the embedding models shared by search, ingestion and selectors"""
+
+    def __init__(self, max_batch_size: int, max_wait_ms: float):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._batchers: dict[tuple[str, str], EmbeddingBatcher] = {}
+        self._lock = threading.Lock()
+
+    def _get_batcher(self, model_name: str, device: Optional[str]) -> EmbeddingBatcher:
+        key = (model_name, device or "auto")
+        with self._lock:
+            batcher = self._batchers.get(key)
+            if batcher is None:
+                batcher = EmbeddingBatcher(model_name, device, self.max_batch_size, self.max_wait)
+                self._batchers[key] = batcher
+            return batcher
+
+    def submit(self, model_name: str, texts: list[str], device: Optional[str] = None) -> Future:
+        """Queue texts for encoding with the given model, return a future of their embeddings"""
+        return self._get_batcher(model_name, device).submit(list(texts))
+
+    def encode(self, model_name: str, texts: list[str], device: Optional[str] = None) -> np.ndarray:
+        """Embeddings of texts, encoded together with concurrent requests for the same model"""
+        return self.submit(model_name, texts, device).result()
+
+    def encoder(
+        self, model_name: str, device: Optional[str] = None
+    ) -> Callable[[list[str]], np.ndarray]:
+        """Encode function bound to a model, as taken by the embedding caches"""
+        return lambda texts: self.encode(model_name, texts, device)
+
+    def get_stats(self) -> list[dict[str, Any]]:
+        """Batching counters per model"""
+        with self._lock:
+            batchers = list(self._batchers.values())
+        return [batcher.get_stats() for batcher in batchers]
+
+
+# Global embedding service instance
+embedding_service = EmbeddingService(
+    EMBEDDING_MICRO_BATCH_MAX_SIZE, EMBEDDING_MICRO_BATCH_MAX_WAIT_MS
+)
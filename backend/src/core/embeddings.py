@@ -0,0 +1,78 @@
+import os
+import threading
+import time
+from typing import Any, Optional
+
+import psutil
+from sentence_transformers import SentenceTransformer
+
+
+class EmbeddingModelRegistry:
+    """Process-wide registry that loads each SentenceTransformer model only once"""
+
+    def __init__(self):
+        self._models: dict[tuple[str, str], SentenceTransformer] = {}
+        self._stats: dict[tuple[str, str], dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        # One lock per model key so loading a large model doesn't block lookups of others
+        self._load_locks: dict[tuple[str, str], threading.Lock] = {}
+
+    @staticmethod
+    def _make_key(model_name: str, device: Optional[str]) -> tuple[str, str]:
+        return model_name, device or "auto"
+
+    def get_model(self, model_name: str, device: Optional[str] = None) -> SentenceTransformer:
+        """Return the shared model instance, loading it on first use"""
+        key = self._make_key(model_name, device)
+
+        model = self._models.get(key)
+        if model is not None:
+            return model
+
+        with self._lock:
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        with load_lock:
+            # Another thread may have finished loading while we were waiting
+            model = self._models.get(key)
+            if model is not None:
+                return model
+
+            process = psutil.Process(os.getpid())
+            rss_before = process.memory_info().rss
+            start_time = time.time()
+
+            model = SentenceTransformer(model_name, device=device)
+
+            load_time = time.time() - start_time
+            rss_after = process.memory_info().rss
+            param_bytes = sum(p.numel() * p.element_size() for p in model.parameters())
+
+            with self._lock:
+                self._models[key] = model
+                self._stats[key] = {
+                    "model_name": model_name,
+                    "device": str(model.device),
+                    "requested_device": key[1],
+                    "load_time_seconds": round(load_time, 3),
+                    "parameters_mb": round(param_bytes / 1024**2, 2),
+                    "rss_delta_mb": round(max(rss_after - rss_before, 0) / 1024**2, 2),
+                    "embedding_dimension": model.get_sentence_embedding_dimension(),
+                    "loaded_at": start_time,
+                }
+
+            print(f"Loaded embedding model {model_name} ({key[1]}) in {load_time:.2f}s")
+            return model
+
+    def is_loaded(self, model_name: str, device: Optional[str] = None) -> bool:
+        """Check whether a model is already resident in this process"""
+        return self._make_key(model_name, device) in self._models
+
+    def get_stats(self) -> list[dict[str, Any]]:
+        """Load time and resident memory per loaded model"""
+        with self._lock:
+            return [dict(stats) for stats in self._stats.values()]
+
+
+# Global embedding model registry instance
+embedding_registry = EmbeddingModelRegistry()
@@ -1,20 +1,108 @@
+import asyncio
+import hashlib
 import os
 import uuid
 from abc import ABC, abstractmethod
-from typing import BinaryIO
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
+from itertools import chain
+from typing import BinaryIO, Iterator, Optional
 
 import boto3
 from botocore.exceptions import ClientError, NoCredentialsError
 
-from src.core.settings import APP_SETTINGS, KB_FOLDER
+from src.core.settings import (
+    APP_SETTINGS,
+    KB_FOLDER,
+    MAX_FILE_SIZE,
+    S3_MULTIPART_PART_SIZE,
+    UPLOAD_CHUNK_SIZE,
+)
+
+
+class FileTooLargeError(Exception):
+    """Raised while streaming an upload once it grows past the size limit"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        super().__init__(f"File too large. Maximum size is {max_size / (1024 * 1024):.1f}MB")
+
+
+class ChunkedUpload:
+    """Reads an upload in fixed-size chunks, counting and hashing it on the way
+
+    Chunks are also written to the tee file when one is given.
+    """
+
+    def __init__(
+        self,
+        file: BinaryIO,
+        max_size: int,
+        chunk_size: int = UPLOAD_CHUNK_SIZE,
+        tee: Optional[BinaryIO] = None,
+    ):
+        self.file = file
+        self.max_size = max_size
+        self.chunk_size = chunk_size
+        self.tee = tee
+        self.size = 0
+        self._sha256 = hashlib.sha256()
+
+    def __iter__(self) -> Iterator[bytes]:
+        while True:
+            chunk = self.file.read(self.chunk_size)
+            if not chunk:
+                return
+            self.size += len(chunk)
+            if self.size > self.max_size:
+                raise FileTooLargeError(self.max_size)
+            self._sha256.update(chunk)
+            if self.tee is not None:
+                self.tee.write(chunk)
+            yield chunk
+
+    @property
+    def content_hash(self) -> str:
+        """sha256 of the bytes read so far"""
+        return self._sha256.hexdigest()
+
+
+def remove_spool_file(spool_path: Optional[str]):
+    """Delete a local spool copy of an upload if there is one"""
+    if spool_path and os.path.exists(spool_path):
+        os.remove(spool_path)
+
+
+def open_spool_file(spool_path: Optional[str]):
+    return open(spool_path, "wb") if spool_path else nullcontext()
 
 
 class FileStorageInterface(ABC):
     """Abstract interface for file storage"""
 
     @abstractmethod
-    def save_file(self, file: BinaryIO, filename: str, file_type: str) -> dict:
-        """Save file and return storage info"""
+    def save_file(
+        self,
+        file: BinaryIO,
+        filename: str,
+        file_type: str,
+        max_size: int = MAX_FILE_SIZE,
+        spool_path: Optional[str] = None,
+    ) -> dict:
+        """Stream a file into storage and return storage info with its size and sha256
+
+        With spool_path the stream is also written to that local file while it is
+        stored. Raises FileTooLargeError, leaving nothing stored or spooled, once
+        more than max_size bytes were read.
+        """
+        pass
+
+    @abstractmethod
+    def store_blob(self, file_path: str, content_hash: str, file_type: str) -> str:
+        """Move a saved file to the path addressed by its content hash and return that path
+
+        When the blob is already stored the saved file is deleted instead.
+        """
         pass
 
     @abstractmethod
@@ -37,6 +125,26 @@ class FileStorageInterface(ABC):
         """Save text content as a file"""
         pass
 
+    # Async variants run the blocking disk and boto3 calls in worker threads, so
+    # async routes keep serving other requests while files are read or sent
+
+    async def save_file_async(
+        self,
+        file: BinaryIO,
+        filename: str,
+        file_type: str,
+        max_size: int = MAX_FILE_SIZE,
+        spool_path: Optional[str] = None,
+    ) -> dict:
+        """save_file without blocking the event loop"""
+        return await asyncio.to_thread(
+            self.save_file, file, filename, file_type, max_size, spool_path
+        )
+
+    async def file_exists_async(self, file_path: str) -> bool:
+        """file_exists without blocking the event loop"""
+        return await asyncio.to_thread(self.file_exists, file_path)
+
 
 class LocalFileStorage(FileStorageInterface):
     """Local file storage implementation"""
@@ -45,25 +153,42 @@ class LocalFileStorage(FileStorageInterface):
         self.storage_path = KB_FOLDER
         os.makedirs(self.storage_path, exist_ok=True)
 
-    def save_file(self, file: BinaryIO, filename: str, file_type: str) -> dict:
+    def save_file(
+        self,
+        file: BinaryIO,
+        filename: str,
+        file_type: str,
+        max_size: int = MAX_FILE_SIZE,
+        spool_path: Optional[str] = None,
+    ) -> dict:
         """Save file locally"""
-        try:
-            # Generate unique filename
-            unique_filename = f"{uuid.uuid4()}_{filename}"
-            file_path = os.path.join(self.storage_path, unique_filename)
+        # Generate unique filename
+        unique_filename = f"{uuid.uuid4()}_{filename}"
+        file_path = os.path.join(self.storage_path, unique_filename)
+        # Written under a temporary name so a rejected upload never shows up
+        partial_path = f"{file_path}.part"
 
-            # Save file
-            with open(file_path, "wb") as f:
-                content = file.read()
-                f.write(content)
+        try:
+            with open(partial_path, "wb") as f, open_spool_file(spool_path) as spool:
+                upload = ChunkedUpload(file, max_size, tee=spool)
+                for chunk in upload:
+                    f.write(chunk)
+            os.replace(partial_path, file_path)
 
             return {
                 "file_path": file_path,
                 "filename": unique_filename,
-                "file_size": len(content),
+                "file_size": upload.size,
+                "content_hash": upload.content_hash,
                 "storage_type": "local",
             }
+        except FileTooLargeError:
+            self.delete_file(partial_path)
+            remove_spool_file(spool_path)
+            raise
         except Exception as e:
+            self.delete_file(partial_path)
+            remove_spool_file(spool_path)
             raise Exception(f"Error saving file locally: {str(e)}")
 
     def save_text_as_file(self, text_content: str, filename: str) -> dict:
@@ -74,18 +199,32 @@ class LocalFileStorage(FileStorageInterface):
             file_path = os.path.join(self.storage_path, unique_filename)
 
             # Save text content
-            with open(file_path, "w", encoding="utf-8") as f:
-                f.write(text_content)
+            content_bytes = text_content.encode("utf-8")
+            with open(file_path, "wb") as f:
+                f.write(content_bytes)
 
             return {
                 "file_path": file_path,
                 "filename": unique_filename,
-                "file_size": len(text_content.encode("utf-8")),
+                "file_size": len(content_bytes),
+                "content_hash": hashlib.sha256(content_bytes).hexdigest(),
                 "storage_type": "local",
             }
         except Exception as e:
             raise Exception(f"Error saving text file locally: {str(e)}")
 
+    def store_blob(self, file_path: str, content_hash: str, file_type: str) -> str:
+        """Rename a saved file to its content hash"""
+        blob_path = os.path.join(self.storage_path, f"{content_hash}.{file_type}")
+        try:
+            if os.path.exists(blob_path):
+                os.remove(file_path)
+            else:
+                os.replace(file_path, blob_path)
+            return blob_path
+        except Exception as e:
+            raise Exception(f"Error storing blob locally: {str(e)}")
+
     def delete_file(self, file_path: str) -> bool:
         """Delete file from local storage"""
         try:
@@ -98,10 +237,8 @@ class LocalFileStorage(FileStorageInterface):
             return False
 
     def get_file_url(self, file_path: str) -> str:
-        """Get local file URL"""
-        # Return relative path for local files
-        filename = os.path.basename(file_path)
-        return f"/static/knowledge/{filename}"
+        """Get local file path, there is no public URL as only the download route serves them"""
+        return file_path
 
     def file_exists(self, file_path: str) -> bool:
         """Check if local file exists"""
@@ -126,33 +263,109 @@ class S3FileStorage(FileStorageInterface):
         except NoCredentialsError:
             raise Exception("AWS credentials not found")
 
-    def save_file(self, file: BinaryIO, filename: str, file_type: str) -> dict:
-        """Save file to S3"""
-        try:
-            # Generate unique S3 key
-            unique_filename = f"{uuid.uuid4()}_{filename}"
-            s3_key = f"knowledge_base/{unique_filename}"
-
-            # Read file content
-            content = file.read()
+    def save_file(
+        self,
+        file: BinaryIO,
+        filename: str,
+        file_type: str,
+        max_size: int = MAX_FILE_SIZE,
+        spool_path: Optional[str] = None,
+    ) -> dict:
+        """Save file to S3, as a multipart upload once it outgrows a single part"""
+        # Generate unique S3 key
+        unique_filename = f"{uuid.uuid4()}_{filename}"
+        s3_key = f"knowledge_base/{unique_filename}"
+        content_type = self._get_content_type(file_type)
 
-            # Upload to S3
-            self.s3_client.put_object(
-                Bucket=self.bucket_name,
-                Key=s3_key,
-                Body=content,
-                ContentType=self._get_content_type(file_type),
-            )
+        try:
+            with open_spool_file(spool_path) as spool:
+                upload = ChunkedUpload(file, max_size, tee=spool)
+                parts = self._iter_parts(upload)
+                first_part = next(parts, b"")
+
+                if len(first_part) < S3_MULTIPART_PART_SIZE:
+                    # Small files go up in a single request
+                    self.s3_client.put_object(
+                        Bucket=self.bucket_name,
+                        Key=s3_key,
+                        Body=first_part,
+                        ContentType=content_type,
+                    )
+                else:
+                    self._multipart_upload(s3_key, content_type, chain([first_part], parts))
 
             return {
                 "file_path": s3_key,
                 "filename": unique_filename,
-                "file_size": len(content),
+                "file_size": upload.size,
+                "content_hash": upload.content_hash,
                 "storage_type": "s3",
                 "bucket_name": self.bucket_name,
             }
         except ClientError as e:
+            remove_spool_file(spool_path)
             raise Exception(f"Error uploading to S3: {str(e)}")
+        except BaseException:
+            remove_spool_file(spool_path)
+            raise
+
+    @staticmethod
+    def _iter_parts(upload: ChunkedUpload) -> Iterator[bytes]:
+        """Regroup upload chunks into parts of S3_MULTIPART_PART_SIZE, the last may be smaller"""
+        buffer = bytearray()
+        for chunk in upload:
+            buffer += chunk
+            while len(buffer) >= S3_MULTIPART_PART_SIZE:
+                yield bytes(buffer[:S3_MULTIPART_PART_SIZE])
+                del buffer[:S3_MULTIPART_PART_SIZE]
+        if buffer:
+            yield bytes(buffer)
+
+    def _multipart_upload(self, s3_key: str, content_type: str, parts: Iterator[bytes]):
+        """Upload parts in order, aborting so no orphaned parts are billed on failure
+
+        Each part is sent from a background thread while the next one is read and
+        spooled, so at most two parts are held in memory.
+        """
+        upload_id = self.s3_client.create_multipart_upload(
+            Bucket=self.bucket_name, Key=s3_key, ContentType=content_type
+        )["UploadId"]
+        try:
+            completed = []
+            with ThreadPoolExecutor(max_workers=1) as uploader:
+                in_flight: Optional[Future] = None
+                try:
+                    for part_number, body in enumerate(parts, start=1):
+                        if in_flight is not None:
+                            completed.append(in_flight.result())
+                        in_flight = uploader.submit(
+                            self._upload_part, s3_key, upload_id, part_number, body
+                        )
+                finally:
+                    if in_flight is not None:
+                        # Also waited on when reading fails so the abort comes last
+                        completed.append(in_flight.result())
+            self.s3_client.complete_multipart_upload(
+                Bucket=self.bucket_name,
+                Key=s3_key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": completed},
+            )
+        except BaseException:
+            self.s3_client.abort_multipart_upload(
+                Bucket=self.bucket_name, Key=s3_key, UploadId=upload_id
+            )
+            raise
+
+    def _upload_part(self, s3_key: str, upload_id: str, part_number: int, body: bytes) -> dict:
+        response = self.s3_client.upload_part(
+            Bucket=self.bucket_name,
+            Key=s3_key,
+            UploadId=upload_id,
+            PartNumber=part_number,
+            Body=body,
+        )
+        return {"ETag": response["ETag"], "PartNumber": part_number}
 
     def save_text_as_file(self, text_content: str, filename: str) -> dict:
         """Save text content as a .txt file to S3"""
@@ -176,12 +389,28 @@ class S3FileStorage(FileStorageInterface):
                 "file_path": s3_key,
                 "filename": unique_filename,
                 "file_size": len(content_bytes),
+                "content_hash": hashlib.sha256(content_bytes).hexdigest(),
                 "storage_type": "s3",
                 "bucket_name": self.bucket_name,
             }
         except ClientError as e:
             raise Exception(f"Error uploading text to S3: {str(e)}")
 
+    def store_blob(self, file_path: str, content_hash: str, file_type: str) -> str:
+        """Copy a saved object to its content hash key within S3, then delete the original"""
+        blob_key = f"knowledge_base/blobs/{content_hash}.{file_type}"
+        try:
+            if not self.file_exists(blob_key):
+                self.s3_client.copy_object(
+                    Bucket=self.bucket_name,
+                    Key=blob_key,
+                    CopySource={"Bucket": self.bucket_name, "Key": file_path},
+                )
+            self.s3_client.delete_object(Bucket=self.bucket_name, Key=file_path)
+            return blob_key
+        except ClientError as e:
+            raise Exception(f"Error storing blob in S3: {str(e)}")
+
     def delete_file(self, file_path: str) -> bool:
         """Delete file from S3"""
         try:
@@ -209,6 +438,10 @@ class S3FileStorage(FileStorageInterface):
         except ClientError as e:
             raise Exception(f"Error generating presigned URL: {str(e)}")
 
+    async def get_presigned_url_async(self, file_path: str, expiration: int = 3600) -> str:
+        """get_presigned_url without blocking the event loop"""
+        return await asyncio.to_thread(self.get_presigned_url, file_path, expiration)
+
     def file_exists(self, file_path: str) -> bool:
         """Check if S3 file exists"""
         try:
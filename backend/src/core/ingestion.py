@@ -0,0 +1,215 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Optional
+from uuid import UUID
+
+from sqlmodel import Session
+
+from src.core.db import engine
+from src.core.insights import insight_generator
+from src.core.settings import (
+    INGESTION_MAX_PENDING,
+    INGESTION_PER_USER_LIMIT,
+    INGESTION_PROGRESS_HISTORY,
+    INGESTION_WORKERS,
+)
+from src.models.knowledge_base import KnowledgeBase, KnowledgeBaseInsight
+
+ProgressCallback = Callable[[dict[str, Any]], None]
+
+
+class IngestionJob:
+    """Knowledge base processing work handed to the ingestion queue"""
+
+    def __init__(
+        self,
+        kb_id: UUID,
+        user_id: UUID,
+        process: Callable[[ProgressCallback], dict[str, Any]],
+        on_failure: Optional[Callable[[], None]] = None,
+        on_cancel: Optional[Callable[[], None]] = None,
+    ):
+        self.kb_id = kb_id
+        self.user_id = user_id
+        # Runs the RAG pipeline and returns its insights
+        self.process = process
+        # Cleans up stored artifacts when processing fails
+        self.on_failure = on_failure
+        # Releases what was held for a job whose knowledge base was deleted before it ran
+        self.on_cancel = on_cancel
+        self.submitted_at = time.time()
+
+
+class IngestionQueue:
+    """Bounded worker pool that processes uploads outside of the request"""
+
+    def __init__(self, workers: int, max_pending: int, per_user_limit: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.per_user_limit = per_user_limit
+
+        self._condition = threading.Condition()
+        self._pending: deque[IngestionJob] = deque()
+        self._running: dict[UUID, int] = {}
+        self._threads: list[threading.Thread] = []
+        self._progress: OrderedDict[str, dict[str, Any]] = OrderedDict()
+
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def submit(self, job: IngestionJob) -> bool:
+        """Queue a job, False when the queue is full"""
+        with self._condition:
+            if len(self._pending) >= self.max_pending:
+                self.rejected += 1
+                return False
+            self._ensure_workers()
+            self._pending.append(job)
+            self._set_progress(job.kb_id, stage="pending", queued_at=job.submitted_at)
+            self._condition.notify()
+        return True
+
+    def get_progress(self, kb_id: UUID) -> Optional[dict[str, Any]]:
+        """Progress of a job seen by this process, None if unknown"""
+        with self._condition:
+            progress = self._progress.get(str(kb_id))
+            return dict(progress) if progress else None
+
+    def _ensure_workers(self):
+        # Started lazily so importing the module doesn't spawn threads, caller holds the lock
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(
+                target=self._worker, name=f"ingestion-{len(self._threads)}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def _next_job(self) -> Optional[IngestionJob]:
+        """Oldest job whose user is below the concurrency limit, caller holds the lock"""
+        for position, job in enumerate(self._pending):
+            if self._running.get(job.user_id, 0) < self.per_user_limit:
+                del self._pending[position]
+                return job
+        return None
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                job = self._next_job()
+                while job is None:
+                    self._condition.wait()
+                    job = self._next_job()
+                self._running[job.user_id] = self._running.get(job.user_id, 0) + 1
+
+            try:
+                self._run(job)
+            except Exception as e:
+                # Keep the worker alive, e.g. when the entry is deleted mid-processing
+                print(f"Error running ingestion job {job.kb_id}: {e}")
+            finally:
+                with self._condition:
+                    self._running[job.user_id] -= 1
+                    if not self._running[job.user_id]:
+                        del self._running[job.user_id]
+                    # A job of the same user may have become eligible
+                    self._condition.notify_all()
+
+    def _run(self, job: IngestionJob):
+        with Session(engine) as session:
+            kb_entry = session.get(KnowledgeBase, job.kb_id)
+            if not kb_entry:
+                # Deleted while it was waiting in the queue
+                self._set_progress(job.kb_id, stage="cancelled", finished=True)
+                if job.on_cancel:
+                    job.on_cancel()
+                return
+
+            def report(progress: dict[str, Any]):
+                self._set_progress(job.kb_id, **progress)
+                # The database only sees stage transitions, not every batch
+                if kb_entry.processing_status != progress["stage"]:
+                    kb_entry.processing_status = progress["stage"]
+                    session.commit()
+
+            try:
+                report({"stage": "processing", "started_at": time.time()})
+                insights = job.process(report)
+
+                insight = KnowledgeBaseInsight(knowledge_base_id=kb_entry.id)
+                # A None summary means generation was deferred past the upload
+                deferred = insights["summary"] is None
+                if not deferred:
+                    insight.summary = insights["summary"]
+                    insight.set_key_insights(insights["key_insights"])
+                    insight.set_entities(insights.get("entities", []))
+                    insight.set_topics(insights.get("topics", []))
+                insight.processed_content = insights.get("processed_content")
+                insight.processing_time = insights.get("processing_time")
+                session.add(insight)
+
+                kb_entry.processing_status = "completed"
+                session.commit()
+                self._set_progress(
+                    job.kb_id,
+                    stage="completed",
+                    chunks_indexed=insights.get("chunks_count", 0),
+                    finished=True,
+                )
+                with self._condition:
+                    self.completed += 1
+                if deferred:
+                    insight_generator.schedule(job.kb_id)
+            except Exception as e:
+                print(f"Error processing knowledge base {job.kb_id}: {e}")
+                session.rollback()
+                self._set_progress(job.kb_id, stage="failed", error=str(e), finished=True)
+                with self._condition:
+                    self.failed += 1
+
+                # Cleanup comes before the status write, which fails if the row was deleted
+                if job.on_failure:
+                    try:
+                        job.on_failure()
+                    except Exception as cleanup_error:
+                        print(f"Error cleaning up knowledge base {job.kb_id}: {cleanup_error}")
+
+                try:
+                    kb_entry.processing_status = "failed"
+                    session.commit()
+                except Exception as status_error:
+                    session.rollback()
+                    print(f"Error marking knowledge base {job.kb_id} failed: {status_error}")
+
+    def _set_progress(self, kb_id: UUID, **updates):
+        with self._condition:
+            key = str(kb_id)
+            progress = self._progress.setdefault(key, {})
+            progress.update(updates)
+            progress["updated_at"] = time.time()
+            self._progress.move_to_end(key)
+            # Forget the oldest finished jobs, their final status lives in the database
+            while len(self._progress) > INGESTION_PROGRESS_HISTORY:
+                oldest = next(iter(self._progress))
+                if not self._progress[oldest].get("finished"):
+                    break
+                del self._progress[oldest]
+
+    def get_stats(self) -> dict[str, Any]:
+        """Queue depth, running jobs and outcome counters"""
+        with self._condition:
+            return {
+                "workers": self.workers,
+                "per_user_limit": self.per_user_limit,
+                "pending": len(self._pending),
+                "max_pending": self.max_pending,
+                "running": sum(self._running.values()),
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+            }
+
+
+# Global ingestion queue instance
+ingestion_queue = IngestionQueue(INGESTION_WORKERS, INGESTION_MAX_PENDING, INGESTION_PER_USER_LIMIT)
@@ -0,0 +1,144 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
+from uuid import UUID
+
+from sqlmodel import Session, select
+
+from src.core.db import engine
+from src.core.rag import rag_service
+from src.core.settings import INSIGHT_MODE
+from src.models.knowledge_base import KnowledgeBase, KnowledgeBaseInsight
+
+_LOCK_STRIPES = 64  # Locks shared by hash, bounds memory however many knowledge bases exist
+
+
+class InsightGenerator:
+    """Generates knowledge base insights that were deferred at upload
+
+    In lazy mode an insight is generated on its first view. Background mode also
+    queues it on a single low-priority worker once the upload is indexed, a view
+    arriving first simply generates it sooner.
+    """
+
+    def __init__(self, mode: str):
+        self.mode = mode
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self._locks = [threading.Lock() for _ in range(_LOCK_STRIPES)]
+
+        self.generated = 0
+        self.pending = 0
+
+    @property
+    def deferred(self) -> bool:
+        """Whether uploads skip the insight LLM call"""
+        return self.mode != "eager"
+
+    def schedule(self, kb_id: UUID):
+        """Queue a deferred insight for background generation, a no-op unless in background mode"""
+        if self.mode != "background":
+            return
+        with self._executor_lock:
+            if self._executor is None:
+                # Started lazily so importing the module doesn't spawn threads
+                self._executor = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="deferred-insights"
+                )
+            self.pending += 1
+        self._executor.submit(self._generate_in_background, kb_id)
+
+    def _generate_in_background(self, kb_id: UUID):
+        try:
+            self.generate(kb_id)
+        except Exception as e:
+            print(f"Error generating insight of knowledge base {kb_id}: {e}")
+        finally:
+            with self._executor_lock:
+                self.pending -= 1
+
+    def generate(self, kb_id: UUID) -> Optional[KnowledgeBaseInsight]:
+        """The knowledge base's insight, generated and stored first if it was deferred
+
+        Concurrent callers for the same knowledge base wait for the first one
+        instead of repeating the LLM call.
+        """
+        with self._locks[hash(kb_id) % _LOCK_STRIPES]:
+            with Session(engine) as session:
+                statement = select(KnowledgeBaseInsight).where(
+                    KnowledgeBaseInsight.knowledge_base_id == kb_id
+                )
+                insight = session.exec(statement).first()
+                if insight is None or insight.summary is not None:
+                    return insight
+                # Deleted once its ingestion completed, before this ran
+                kb_entry = session.get(KnowledgeBase, kb_id)
+                if kb_entry is None:
+                    return None
+
+                start_time = time.time()
+                generated_copy = self._generated_copy(session, kb_entry)
+                if generated_copy is not None:
+                    # Uploads of the same file share one LLM call
+                    insight.summary = generated_copy.summary
+                    insight.key_insights = generated_copy.key_insights
+                    insight.entities = generated_copy.entities
+                    insight.topics = generated_copy.topics
+                else:
+                    insights = rag_service.generate_insights(insight.processed_content or "")
+                    # Or while the LLM call was running
+                    if not self._exists(session, kb_id):
+                        return None
+                    insight.summary = insights["summary"]
+                    insight.set_key_insights(insights["key_insights"])
+                    insight.set_entities(insights.get("entities", []))
+                    insight.set_topics(insights.get("topics", []))
+                # Only the prompt text needed keeping until now
+                insight.processed_content = (insight.processed_content or "")[:2000]
+                insight.processing_time = (insight.processing_time or 0) + (
+                    time.time() - start_time
+                )
+                session.add(insight)
+                try:
+                    session.commit()
+                except Exception:
+                    session.rollback()
+                    if not self._exists(session, kb_id):
+                        return None
+                    raise
+                session.refresh(insight)
+                with self._executor_lock:
+                    self.generated += 1
+                return insight
+
+    @staticmethod
+    def _generated_copy(
+        session: Session, kb_entry: KnowledgeBase
+    ) -> Optional[KnowledgeBaseInsight]:
+        """A generated insight of the user's other knowledge bases with the same content"""
+        if not kb_entry.content_hash:
+            return None
+        statement = (
+            select(KnowledgeBaseInsight)
+            .join(KnowledgeBase)
+            .where(KnowledgeBase.user_id == kb_entry.user_id)
+            .where(KnowledgeBase.content_hash == kb_entry.content_hash)
+            .where(KnowledgeBase.id != kb_entry.id)
+            .where(KnowledgeBaseInsight.summary.is_not(None))
+        )
+        return session.exec(statement).first()
+
+    @staticmethod
+    def _exists(session: Session, kb_id: UUID) -> bool:
+        statement = select(KnowledgeBase.id).where(KnowledgeBase.id == kb_id)
+        return session.exec(statement).first() is not None
+
+    def get_stats(self) -> dict[str, Any]:
+        """Mode and counters of deferred insight generation"""
+        with self._executor_lock:
+            return {"mode": self.mode, "generated": self.generated, "pending": self.pending}
+
+
+# Global insight generator instance
+insight_generator = InsightGenerator(INSIGHT_MODE)
@@ -0,0 +1,89 @@
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, desc, select
+
+from src.core.file_storage import file_storage
+from src.models.knowledge_base import KnowledgeBase, KnowledgeBaseBlob, KnowledgeBaseInsight
+
+
+def _locked_blob(session: Session, content_hash: str) -> Optional[KnowledgeBaseBlob]:
+    # Row lock held until the caller commits, serializing uploads and deletes of a blob
+    statement = (
+        select(KnowledgeBaseBlob)
+        .where(KnowledgeBaseBlob.content_hash == content_hash)
+        .with_for_update()
+    )
+    return session.exec(statement).first()
+
+
+def acquire_blob(session: Session, storage_info: dict, file_type: str) -> str:
+    """Reference the blob of a saved upload and return its path, left for the caller to commit
+
+    A new content hash moves the upload to its blob path, an already stored one
+    deletes the upload and reuses the blob.
+    """
+    content_hash = storage_info["content_hash"]
+    blob = _locked_blob(session, content_hash)
+    if blob is None:
+        blob_path = file_storage.store_blob(storage_info["file_path"], content_hash, file_type)
+        try:
+            with session.begin_nested():
+                session.add(
+                    KnowledgeBaseBlob(
+                        content_hash=content_hash,
+                        file_path=blob_path,
+                        file_size=storage_info["file_size"],
+                        ref_count=1,
+                    )
+                )
+            return blob_path
+        except IntegrityError:
+            # Another upload of the same content created the row first
+            blob = _locked_blob(session, content_hash)
+    else:
+        file_storage.delete_file(storage_info["file_path"])
+
+    blob.ref_count += 1
+    session.add(blob)
+    return blob.file_path
+
+
+def release_blob(session: Session, content_hash: str):
+    """Drop a reference to a blob, deleting it once unused, left for the caller to commit"""
+    blob = _locked_blob(session, content_hash)
+    if blob is None:
+        return
+    blob.ref_count -= 1
+    if blob.ref_count > 0:
+        session.add(blob)
+        return
+    # Deleted under the row lock so an upload of the same content waits and stores it anew
+    file_storage.delete_file(blob.file_path)
+    session.delete(blob)
+
+
+def release_file(session: Session, kb_entry: KnowledgeBase):
+    """Release the stored file of a knowledge base, files uploaded before blobs are deleted"""
+    if kb_entry.content_hash:
+        release_blob(session, kb_entry.content_hash)
+        kb_entry.content_hash = None
+        session.add(kb_entry)
+    elif kb_entry.file_path:
+        file_storage.delete_file(kb_entry.file_path)
+
+
+def find_processed_copy(
+    session: Session, user_id: UUID, content_hash: str
+) -> Optional[KnowledgeBase]:
+    """The user's latest completed knowledge base with the same content and an insight"""
+    statement = (
+        select(KnowledgeBase)
+        .join(KnowledgeBaseInsight)
+        .where(KnowledgeBase.user_id == user_id)
+        .where(KnowledgeBase.content_hash == content_hash)
+        .where(KnowledgeBase.processing_status == "completed")
+        .order_by(desc(KnowledgeBase.upload_date))
+    )
+    return session.exec(statement).first()
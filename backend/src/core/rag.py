@@ -1,25 +1,27 @@
 import json
-import os
+import re
 import time
-from typing import Any
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Iterator, Optional
 from uuid import UUID
 
-import faiss
-import numpy as np
-import pandas as pd
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from PyPDF2 import PdfReader
-from sentence_transformers import SentenceTransformer
 
+from src.core.document_parsing import document_parser, extract_pages
 from src.core.settings import (
     CHUNK_OVERLAP,
     CHUNK_SIZE,
-    EMBEDDING_MODEL,
+    HYBRID_SEARCH_CANDIDATES,
+    INSIGHT_WORKERS,
     LLM_CLIENT,
     LLM_MODEL_NAME,
     MAX_CONTEXT_TOKENS,
-    VECTOR_STORE_FOLDER,
+    RAG_CONTEXT_K,
+    RRF_K,
+    STREAM_SPLIT_WINDOW,
 )
+from src.core.tokenizer import count_tokens, truncate_to_tokens
+from src.core.vector_store import vector_store_cache
 
 
 class DocumentProcessor:
@@ -34,61 +36,23 @@ class DocumentProcessor:
 
     def process_pdf(self, file_path: str) -> str:
         """Extract text from PDF"""
-        try:
-            reader = PdfReader(file_path)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-            return text.strip()
-        except Exception as e:
-            raise Exception(f"Error processing PDF: {str(e)}")
+        return "\n".join(self.iter_pdf_pages(file_path)).strip()
+
+    def iter_pdf_pages(self, file_path: str) -> Iterator[str]:
+        """Lazily extract text page by page so a large PDF is never held in memory at once"""
+        return extract_pages(file_path, "pdf")
 
     def process_csv(self, file_path: str) -> str:
         """Extract text from CSV"""
-        try:
-            df = pd.read_csv(file_path)
-            # Convert DataFrame to descriptive text
-            text = f"Dataset with {len(df)} rows and {len(df.columns)} columns.\n"
-            text += f"Columns: {', '.join(df.columns.tolist())}\n\n"
-
-            # Add sample data and statistics
-            text += "Sample data:\n"
-            text += df.head().to_string() + "\n\n"
-
-            # Add basic statistics for numeric columns
-            numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
-            if numeric_cols:
-                text += "Statistical summary for numeric columns:\n"
-                text += df[numeric_cols].describe().to_string() + "\n\n"
-
-            # Add value counts for categorical columns
-            categorical_cols = df.select_dtypes(include=["object"]).columns.tolist()
-            for col in categorical_cols[:3]:  # Limit to first 3 categorical columns
-                text += f"Value counts for {col}:\n"
-                text += df[col].value_counts().head().to_string() + "\n\n"
-
-            return text.strip()
-        except Exception as e:
-            raise Exception(f"Error processing CSV: {str(e)}")
+        return "".join(extract_pages(file_path, "csv"))
 
     def process_excel(self, file_path: str) -> str:
         """Extract text from Excel"""
-        try:
-            # Read all sheets
-            excel_file = pd.ExcelFile(file_path)
-            text = f"Excel file with {len(excel_file.sheet_names)} sheet(s): {', '.join(excel_file.sheet_names)}\n\n"
-
-            for sheet_name in excel_file.sheet_names:
-                df = pd.read_excel(file_path, sheet_name=sheet_name)
-                text += f"Sheet: {sheet_name}\n"
-                text += f"Size: {len(df)} rows, {len(df.columns)} columns\n"
-                text += f"Columns: {', '.join(df.columns.tolist())}\n"
-                text += "Sample data:\n"
-                text += df.head().to_string() + "\n\n"
-
-            return text.strip()
-        except Exception as e:
-            raise Exception(f"Error processing Excel: {str(e)}")
+        return "".join(extract_pages(file_path, "xlsx"))
+
+    def iter_document(self, file_path: str, file_type: str) -> Iterator[str]:
+        """Extract text pieces in a parser process so parsing doesn't hold the API's GIL"""
+        return document_parser.iter_pages(file_path, file_type)
 
     def process_text(self, content: str) -> str:
         """Process plain text"""
@@ -98,130 +62,25 @@ class DocumentProcessor:
         """Split text into chunks"""
         return self.text_splitter.split_text(text)
 
+    def iter_chunks(self, texts: Iterable[str]) -> Iterator[str]:
+        """Split a stream of text pieces into chunks incrementally
 
-class VectorStore:
-    """Handles vector storage and retrieval using FAISS"""
-
-    def __init__(self, user_id: UUID):
-        self.user_id = user_id
-        self.embedding_model = SentenceTransformer(EMBEDDING_MODEL)
-        self.vector_store_path = os.path.join(VECTOR_STORE_FOLDER, str(user_id))
-        self.index_path = os.path.join(self.vector_store_path, "faiss_index")
-        self.metadata_path = os.path.join(self.vector_store_path, "metadata.json")
-
-        os.makedirs(self.vector_store_path, exist_ok=True)
-
-        # Load existing index and metadata
-        self.index = None
-        self.metadata = []
-        self._load_index()
-
-    def _load_index(self):
-        """Load existing FAISS index and metadata"""
-        if os.path.exists(self.index_path) and os.path.exists(self.metadata_path):
-            try:
-                self.index = faiss.read_index(self.index_path)
-                with open(self.metadata_path, "r", encoding="utf-8") as f:
-                    self.metadata = json.load(f)
-            except Exception as e:
-                print(f"Error loading index: {e}")
-                self.index = None
-                self.metadata = []
-
-    def _save_index(self):
-        """Save FAISS index and metadata"""
-        if self.index is not None:
-            faiss.write_index(self.index, self.index_path)
-            with open(self.metadata_path, "w", encoding="utf-8") as f:
-                json.dump(self.metadata, f, ensure_ascii=False, indent=2)
-
-    def add_documents(self, kb_id: str, chunks: list[str], filename: str):
-        """Add document chunks to vector store"""
-        if not chunks:
-            return
-
-        # Generate embeddings
-        embeddings = self.embedding_model.encode(chunks)
-        embeddings = np.array(embeddings).astype("float32")
-
-        # Create or update FAISS index
-        if self.index is None:
-            dimension = embeddings.shape[1]
-            self.index = faiss.IndexFlatL2(dimension)
-
-        # Add embeddings to index
-        start_idx = self.index.ntotal
-        self.index.add(embeddings)
-
-        # Add metadata
-        for i, chunk in enumerate(chunks):
-            self.metadata.append(
-                {
-                    "kb_id": kb_id,
-                    "filename": filename,
-                    "chunk_index": i,
-                    "text": chunk,
-                    "vector_index": start_idx + i,
-                }
-            )
-
-        # Save index
-        self._save_index()
-
-    def search(self, query: str, k: int = 5) -> list[dict[str, Any]]:
-        """Search for similar documents"""
-        if self.index is None or self.index.ntotal == 0:
-            return []
-
-        # Generate query embedding
-        query_embedding = self.embedding_model.encode([query])
-        query_embedding = np.array(query_embedding).astype("float32")
-
-        # Search
-        distances, indices = self.index.search(query_embedding, min(k, self.index.ntotal))
-
-        # Return results
-        results = []
-        for i, idx in enumerate(indices[0]):
-            if idx < len(self.metadata):
-                result = self.metadata[idx].copy()
-                result["distance"] = float(distances[0][i])
-                results.append(result)
-
-        return results
-
-    def remove_documents(self, kb_id: str):
-        """Remove documents from vector store"""
-        if not self.metadata:
-            return
-
-        # Filter out metadata for the kb_id
-        new_metadata = [m for m in self.metadata if m["kb_id"] != kb_id]
-
-        if len(new_metadata) == len(self.metadata):
-            return  # No documents to remove
-
-        # Rebuild index if documents were removed
-        if new_metadata:
-            chunks = [m["text"] for m in new_metadata]
-            embeddings = self.embedding_model.encode(chunks)
-            embeddings = np.array(embeddings).astype("float32")
-
-            dimension = embeddings.shape[1]
-            self.index = faiss.IndexFlatL2(dimension)
-            self.index.add(embeddings)
-
-            # Update vector indices
-            for i, metadata in enumerate(new_metadata):
-                metadata["vector_index"] = i
+        Text is buffered up to STREAM_SPLIT_WINDOW characters, every chunk but the
+        last is emitted, and the last one is carried over so chunks keep their
+        overlap across piece boundaries.
+        """
+        buffer = ""
+        for text in texts:
+            buffer += text + "\n"
+            if len(buffer) < STREAM_SPLIT_WINDOW:
+                continue
+            chunks = self.text_splitter.split_text(buffer)
+            if len(chunks) > 1:
+                yield from chunks[:-1]
+                buffer = chunks[-1]
 
-            self.metadata = new_metadata
-        else:
-            # No documents left
-            self.index = None
-            self.metadata = []
-
-        self._save_index()
+        if buffer.strip():
+            yield from self.text_splitter.split_text(buffer)
 
 
 class RAGService:
@@ -229,33 +88,76 @@ class RAGService:
 
     def __init__(self):
         self.document_processor = DocumentProcessor()
+        # LLM insight calls run here while the calling thread chunks and embeds
+        self.insight_executor = ThreadPoolExecutor(
+            max_workers=INSIGHT_WORKERS, thread_name_prefix="insights"
+        )
 
     def process_document(
-        self, file_path: str, file_type: str, kb_id: str, filename: str, user_id: UUID
+        self,
+        file_path: str,
+        file_type: str,
+        kb_id: str,
+        filename: str,
+        user_id: UUID,
+        progress_callback: Optional[Callable[[dict[str, Any]], None]] = None,
+        defer_insights: bool = False,
     ) -> dict[str, Any]:
-        """Process document and add to vector store"""
+        """Process document and add to vector store
+
+        Text is streamed from extraction through chunking into batched embedding.
+        The insight LLM call starts as soon as its prompt text is extracted and runs
+        concurrently with embedding, progress_callback receives the current stage
+        and counters as they change. With defer_insights no LLM call is made and the
+        result carries the prompt text instead, with a None summary.
+        """
         start_time = time.time()
+        progress: dict[str, Any] = {
+            "stage": "extracting",
+            "pages_extracted": 0,
+            "chunks_indexed": 0,
+        }
+
+        def report(**updates):
+            progress.update(updates)
+            if progress_callback:
+                progress_callback(dict(progress))
+
+        insights_future: Optional[Future] = None
+
+        def start_insights(text: str):
+            nonlocal insights_future
+            insights_future = self.insight_executor.submit(self.generate_insights, text)
 
         try:
-            # Extract text based on file type
+            # Extract text based on file type, pages stream back from the parser process
+            texts = self.document_processor.iter_document(file_path, file_type)
             if file_type == "pdf":
-                text = self.document_processor.process_pdf(file_path)
-            elif file_type == "csv":
-                text = self.document_processor.process_csv(file_path)
-            elif file_type in ["xlsx", "xls"]:
-                text = self.document_processor.process_excel(file_path)
-            else:
-                raise ValueError(f"Unsupported file type: {file_type}")
+                texts = self._count_pages(texts, report)
 
-            # Chunk the text
-            chunks = self.document_processor.chunk_text(text)
+            # Only the beginning of the document is kept for the insight prompt
+            prefix: list[str] = []
+            texts = self._collect_prefix(
+                texts, prefix, MAX_CONTEXT_TOKENS * 4, None if defer_insights else start_insights
+            )
 
-            # Add to vector store
-            vector_store = VectorStore(user_id)
-            vector_store.add_documents(kb_id, chunks, filename)
+            # Chunk and embed the text in batches as it is extracted
+            vector_store = vector_store_cache.get(user_id)
+            chunks_count = vector_store.add_documents_stream(
+                kb_id,
+                self.document_processor.iter_chunks(texts),
+                filename,
+                progress_callback=lambda count: report(stage="embedding", chunks_indexed=count),
+            )
+            vector_store_cache.refresh(user_id)
 
-            # Generate insights using LLM
-            insights = self._generate_insights(text)
+            text = "\n".join(prefix).strip()
+            if defer_insights:
+                return self._deferred_insights(text, chunks_count, time.time() - start_time)
+
+            # Wait for the insights generated using LLM
+            report(stage="insights")
+            insights = insights_future.result() if insights_future else self.generate_insights(text)
 
             processing_time = time.time() - start_time
 
@@ -265,27 +167,83 @@ class RAGService:
                 "entities": insights.get("entities", []),
                 "topics": insights.get("topics", []),
                 "processing_time": processing_time,
-                "chunks_count": len(chunks),
+                "chunks_count": chunks_count,
                 "processed_content": text[:2000],  # Store first 2000 chars for reference
             }
 
         except Exception as e:
+            if insights_future:
+                insights_future.cancel()
+            # Batches indexed before the failure must not stay searchable
+            self._discard_partial_document(kb_id, user_id)
             raise Exception(f"Error processing document: {str(e)}")
 
-    def process_text(self, text: str, kb_id: str, user_id: UUID) -> dict[str, Any]:
+    @staticmethod
+    def _count_pages(pages: Iterator[str], report: Callable[..., None]) -> Iterator[str]:
+        for count, page in enumerate(pages, start=1):
+            report(pages_extracted=count)
+            yield page
+
+    @staticmethod
+    def _collect_prefix(
+        texts: Iterable[str],
+        prefix: list[str],
+        limit: int,
+        on_complete: Optional[Callable[[str], None]] = None,
+    ) -> Iterator[str]:
+        """Pass texts through while keeping their first `limit` characters in `prefix`
+
+        on_complete receives the prefix once it is full or the texts are exhausted.
+        """
+        collected = 0
+        completed = False
+        for text in texts:
+            if collected < limit:
+                prefix.append(text[: limit - collected])
+                collected += len(prefix[-1]) + 1
+            if collected >= limit and not completed:
+                completed = True
+                if on_complete:
+                    on_complete("\n".join(prefix).strip())
+            yield text
+        if not completed and on_complete:
+            on_complete("\n".join(prefix).strip())
+
+    def _discard_partial_document(self, kb_id: str, user_id: UUID):
+        try:
+            self.remove_knowledge_base(kb_id, user_id)
+        except Exception as e:
+            print(f"Error removing partially indexed document {kb_id}: {e}")
+
+    def process_text(
+        self, text: str, kb_id: str, user_id: UUID, defer_insights: bool = False
+    ) -> dict[str, Any]:
         """Process text input and add to vector store"""
         start_time = time.time()
 
         try:
+            # Generate insights using LLM while the text is chunked and embedded
+            insights_future = (
+                None
+                if defer_insights
+                else self.insight_executor.submit(self.generate_insights, text)
+            )
+
             # Chunk the text
             chunks = self.document_processor.chunk_text(text)
 
             # Add to vector store
-            vector_store = VectorStore(user_id)
+            vector_store = vector_store_cache.get(user_id)
             vector_store.add_documents(kb_id, chunks, "text_input")
+            vector_store_cache.refresh(user_id)
+
+            if insights_future is None:
+                return self._deferred_insights(
+                    text[: MAX_CONTEXT_TOKENS * 4], len(chunks), time.time() - start_time
+                )
 
-            # Generate insights using LLM
-            insights = self._generate_insights(text)
+            # Wait for the insights
+            insights = insights_future.result()
 
             processing_time = time.time() - start_time
 
@@ -302,12 +260,22 @@ class RAGService:
         except Exception as e:
             raise Exception(f"Error processing text: {str(e)}")
 
-    def _generate_insights(self, text: str) -> dict[str, Any]:
+    @staticmethod
+    def _deferred_insights(text: str, chunks_count: int, processing_time: float) -> dict[str, Any]:
+        """Processing result without insights, keeping the text they are generated from later"""
+        return {
+            "summary": None,
+            "key_insights": None,
+            "processing_time": processing_time,
+            "chunks_count": chunks_count,
+            "processed_content": text,
+        }
+
+    def generate_insights(self, text: str) -> dict[str, Any]:
         """Generate insights from text using LLM"""
         try:
             # Truncate text if too long
-            if len(text) > MAX_CONTEXT_TOKENS * 4:  # Rough estimate
-                text = text[: MAX_CONTEXT_TOKENS * 4]
+            text = truncate_to_tokens(text, MAX_CONTEXT_TOKENS)
 
             prompt = f"""
             Please analyze the following document and provide insights in JSON format:
@@ -361,15 +329,53 @@ class RAGService:
                 "topics": ["General content"],
             }
 
-    def search_knowledge_base(self, query: str, user_id: UUID, k: int = 5) -> list[dict[str, Any]]:
-        """Search knowledge base for relevant context"""
-        vector_store = VectorStore(user_id)
-        return vector_store.search(query, k)
+    def search_knowledge_base(
+        self, query: str, user_id: UUID, k: int = RAG_CONTEXT_K
+    ) -> list[dict[str, Any]]:
+        """Search knowledge base for relevant context
+
+        Dense and BM25 keyword candidates are fused by rank, so exact codes and table
+        names surface even when their embeddings are not close to the question.
+        """
+        vector_store = vector_store_cache.get(user_id)
+        candidates = max(k, HYBRID_SEARCH_CANDIDATES)
+        dense_results = vector_store.search(query, candidates)
+        keyword_results = vector_store.keyword_search(query, candidates)
+        return self._fuse_rankings([dense_results, keyword_results], k)
+
+    @staticmethod
+    def _fuse_rankings(rankings: list[list[dict[str, Any]]], k: int) -> list[dict[str, Any]]:
+        """Reciprocal rank fusion of ranked result lists, keyed by vector id"""
+        scores: dict[int, float] = {}
+        results: dict[int, dict[str, Any]] = {}
+        for ranking in rankings:
+            for rank, result in enumerate(ranking, start=1):
+                vector_id = result["vector_id"]
+                scores[vector_id] = scores.get(vector_id, 0.0) + 1.0 / (RRF_K + rank)
+                results.setdefault(vector_id, {}).update(result)
+
+        top_ids = sorted(scores, key=lambda vector_id: scores[vector_id], reverse=True)[:k]
+        return [{**results[vector_id], "score": scores[vector_id]} for vector_id in top_ids]
+
+    def copy_knowledge_base(
+        self, source_kb_id: str, source_user_id: UUID, kb_id: str, filename: str, user_id: UUID
+    ) -> int:
+        """Index an already processed knowledge base again under a new id without re-embedding"""
+        source = vector_store_cache.get(source_user_id)
+        vector_store = vector_store_cache.get(user_id)
+        try:
+            chunks_count = vector_store.copy_documents(source, source_kb_id, kb_id, filename)
+        except Exception as e:
+            self._discard_partial_document(kb_id, user_id)
+            raise Exception(f"Error copying knowledge base: {str(e)}")
+        vector_store_cache.refresh(user_id)
+        return chunks_count
 
     def remove_knowledge_base(self, kb_id: str, user_id: UUID):
         """Remove knowledge base from vector store"""
-        vector_store = VectorStore(user_id)
+        vector_store = vector_store_cache.get(user_id)
         vector_store.remove_documents(kb_id)
+        vector_store_cache.refresh(user_id)
 
     def get_context_for_query(self, query: str, user_id: UUID) -> str:
         """Get relevant context from knowledge base for a query"""
@@ -378,12 +384,71 @@ class RAGService:
         if not results:
             return ""
 
-        context_parts = []
+        return self._build_context(results, MAX_CONTEXT_TOKENS)
+
+    def _build_context(self, results: list[dict[str, Any]], max_tokens: int) -> str:
+        """Pack chunks in relevance order into a token budget
+
+        Text repeated between neighbouring chunks of the same document is sent once,
+        the first chunk that doesn't fit is cut back to the whole sentences that do.
+        """
+        separator_tokens = count_tokens("\n\n")
+        context_parts: list[str] = []
+        packed: dict[tuple[str, int], str] = {}
+        used_tokens = 0
+
         for result in results:
-            context_parts.append(f"From {result['filename']}: {result['text']}")
+            kb_id, chunk_index = result["kb_id"], result["chunk_index"]
+            text = result["text"].strip()
+            # Neighbouring chunks share up to CHUNK_OVERLAP characters
+            previous_text = packed.get((kb_id, chunk_index - 1))
+            if previous_text:
+                text = text[self._overlap_length(previous_text, text) :].strip()
+            next_text = packed.get((kb_id, chunk_index + 1))
+            if next_text:
+                text = text[: len(text) - self._overlap_length(text, next_text)].strip()
+            if not text:
+                continue
+
+            header = f"From {result['filename']}: "
+            cost = count_tokens(header + text) + (separator_tokens if context_parts else 0)
+            if used_tokens + cost <= max_tokens:
+                context_parts.append(header + text)
+                packed[(kb_id, chunk_index)] = result["text"].strip()
+                used_tokens += cost
+                continue
+
+            # Fill the rest of the budget with the sentences that fit, then stop
+            remaining = max_tokens - used_tokens - count_tokens(header)
+            if context_parts:
+                remaining -= separator_tokens
+            text = self._trim_to_sentences(text, remaining)
+            if text:
+                context_parts.append(header + text)
+            break
 
         return "\n\n".join(context_parts)
 
+    @staticmethod
+    def _overlap_length(left: str, right: str) -> int:
+        """Length of the longest suffix of left that starts right, up to CHUNK_OVERLAP"""
+        for length in range(min(len(left), len(right), CHUNK_OVERLAP), 0, -1):
+            if left.endswith(right[:length]):
+                # Very short matches are coincidence rather than splitter overlap
+                return length if length >= 8 else 0
+        return 0
+
+    @staticmethod
+    def _trim_to_sentences(text: str, max_tokens: int) -> str:
+        """Longest run of whole sentences from the start of text within max_tokens"""
+        truncated = truncate_to_tokens(text, max_tokens)
+        if truncated == text:
+            return text
+        boundaries = list(re.finditer(r"[.!?…](?=\s|$)|\n", truncated))
+        if not boundaries:
+            return ""
+        return truncated[: boundaries[-1].end()].strip()
+
 
 # Global RAG service instance
 rag_service = RAGService()
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from typing import Literal
 
 from openai import OpenAI
@@ -68,6 +69,63 @@ class AppSettings(BaseSettings):
     )
     AWS_IAM_POLICY_ARN_BASE: str = Field(default="", description="Base policy ARN for users")
 
+    # Vector Store Configuration
+    VECTOR_STORE_BACKEND: Literal["per_user", "shared"] = Field(
+        default="per_user", description="One index per user, or shards shared by all users"
+    )
+    VECTOR_STORE_CACHE_MAX_MB: int = Field(
+        default=512, description="Memory budget for per-user vector stores cached in process"
+    )
+    VECTOR_INDEX_TYPE: Literal["flat", "hnsw", "ivf"] = Field(
+        default="ivf", description="Index type stores are promoted to once they grow large"
+    )
+    VECTOR_INDEX_PROMOTION_THRESHOLD: int = Field(
+        default=20000, description="Vector count at which a flat index is promoted"
+    )
+    VECTOR_INDEX_COMPRESSION: Literal["none", "fp16", "sq8", "pq"] = Field(
+        default="none", description="Vector encoding of promoted indexes, results are rescored"
+    )
+    VECTOR_INDEX_MMAP: bool = Field(
+        default=False, description="Memory-map index snapshots so workers share their pages"
+    )
+    EMBEDDING_CACHE_MAX_ENTRIES: int = Field(
+        default=200000, description="Maximum chunk embeddings kept in the persistent cache"
+    )
+
+    # Ingestion Configuration
+    INGESTION_WORKERS: int = Field(
+        default=2, description="Background threads processing knowledge base uploads"
+    )
+    INGESTION_MAX_PENDING: int = Field(
+        default=100, description="Queued uploads before new ones are rejected with 503"
+    )
+    INGESTION_PER_USER_LIMIT: int = Field(
+        default=1, description="Uploads of the same user processed concurrently"
+    )
+    INSIGHT_MODE: Literal["eager", "lazy", "background"] = Field(
+        default="eager",
+        description="Generate insights during upload, on first view, or after upload in the background",
+    )
+
+    # Document Parsing Configuration
+    PARSER_WORKERS: int = Field(
+        default=2, description="Documents parsed at once in separate processes, 0 parses inline"
+    )
+    PARSER_TIMEOUT_SECONDS: int = Field(
+        default=300, description="Parsing time after which a document's parser is killed"
+    )
+    PARSER_MEMORY_LIMIT_MB: int = Field(
+        default=2048, description="Address space limit of a parser process, 0 for none"
+    )
+    PARSER_RECYCLE_FILES: int = Field(
+        default=50, description="Files a parser process handles before it is replaced"
+    )
+
+    # Document Profiling Configuration
+    EXCEL_SHEET_WORKERS: int = Field(
+        default=1, description="Threads used to profile the sheets of an Excel upload"
+    )
+
     @property
     def get_database_url(self) -> str:
         if self.is_aws:
@@ -87,6 +145,8 @@ APP_SETTINGS = AppSettings()
 ALLOWED_ORIGINS = [APP_SETTINGS.CLIENT_URL]
 
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # Bytes read at a time while streaming an upload to storage
+S3_MULTIPART_PART_SIZE = 8 * 1024 * 1024  # Larger uploads go to S3 in parts, S3 needs >= 5MB
 ALLOWED_EXTENSIONS = {".txt", ".csv", ".json", ".md", ".pdf", ".docx", ".xlsx", ".xls"}
 
 LLM_BASE_URL = "https://api.deepseek.com"
@@ -96,17 +156,80 @@ LLM_CLIENT = OpenAI(api_key=APP_SETTINGS.DEEPSEEK_API_KEY, base_url=LLM_BASE_URL
 PRIVATE_PATHS = ["/chat", "/kb", "/query", "/user", "/auth/logout"]
 
 STATIC_FOLDER = "static"
-KB_FOLDER = os.path.join(STATIC_FOLDER, "knowledge")
+# Files only served through authorized routes, never mounted like STATIC_FOLDER
+PRIVATE_FOLDER = "storage"
+KB_FOLDER = os.path.join(PRIVATE_FOLDER, "knowledge")
 DOWNLOADS_FOLDER = os.path.join(STATIC_FOLDER, "downloads")
 VECTOR_STORE_FOLDER = os.path.join(STATIC_FOLDER, "vector_store")
+# Local copies of S3 uploads awaiting ingestion, kept out of the public static folder
+UPLOAD_SPOOL_FOLDER = os.path.join(tempfile.gettempdir(), "querypilot_uploads")
 
 # RAG Configuration
 EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 200
 MAX_CONTEXT_TOKENS = 4000
+TOKENIZER_ENCODING = "cl100k_base"  # tiktoken encoding used to count prompt tokens
+CHARS_PER_TOKEN = 4  # Estimate used when the tokenizer can't be loaded
+TOKENIZER_RETRY_SECONDS = 300  # Wait before retrying a tokenizer that failed to load
+EMBEDDING_BATCH_SIZE = 64  # Chunks embedded and indexed per batch during ingestion
+EMBEDDING_MICRO_BATCH_MAX_SIZE = 128  # Texts of concurrent requests encoded in one model run
+EMBEDDING_MICRO_BATCH_MAX_WAIT_MS = 5  # How long a request waits for others to join its batch
+STREAM_SPLIT_WINDOW = CHUNK_SIZE * 8  # Characters buffered before splitting streamed text
+INSIGHT_WORKERS = 4  # Concurrent LLM insight calls overlapping with embedding
+RAG_CONTEXT_K = 4  # Chunks sent to the LLM as knowledge base context
+HYBRID_SEARCH_CANDIDATES = 20  # Candidates taken from each retriever before fusion
+RRF_K = 60  # Reciprocal rank fusion damping, higher flattens the rank weights
+
+# Ingestion Configuration
+INGESTION_WORKERS = APP_SETTINGS.INGESTION_WORKERS
+INGESTION_MAX_PENDING = APP_SETTINGS.INGESTION_MAX_PENDING
+INGESTION_PER_USER_LIMIT = APP_SETTINGS.INGESTION_PER_USER_LIMIT
+INGESTION_PROGRESS_HISTORY = 1000  # Finished jobs whose progress stays queryable
+INSIGHT_MODE = APP_SETTINGS.INSIGHT_MODE
+
+# Document Parsing Configuration
+PARSER_WORKERS = APP_SETTINGS.PARSER_WORKERS
+PARSER_TIMEOUT_SECONDS = APP_SETTINGS.PARSER_TIMEOUT_SECONDS
+PARSER_MEMORY_LIMIT_MB = APP_SETTINGS.PARSER_MEMORY_LIMIT_MB
+PARSER_RECYCLE_FILES = APP_SETTINGS.PARSER_RECYCLE_FILES
+PARSER_QUEUE_PAGES = 16  # Extracted pages buffered between a parser process and the embedder
+
+# Document Profiling Configuration
+CSV_PROFILE_CHUNK_ROWS = 50_000  # Rows read per chunk when profiling CSV uploads
+CSV_PROFILE_SAMPLE_SIZE = 10_000  # Reservoir size per numeric column for quantiles
+CSV_PROFILE_TOP_K_CAPACITY = 1_000  # Distinct values tracked per categorical column
+EXCEL_SAMPLE_ROWS = 5  # Rows parsed per sheet for the sample shown in the profile
+EXCEL_SHEET_WORKERS = APP_SETTINGS.EXCEL_SHEET_WORKERS
+
+# Vector Store Configuration
+VECTOR_STORE_BACKEND = APP_SETTINGS.VECTOR_STORE_BACKEND
+SHARED_VECTOR_STORE_FOLDER = os.path.join(VECTOR_STORE_FOLDER, "shared")
+VECTOR_STORE_SHARDS = 16  # Shards of the shared store, fixed once it holds data
+VECTOR_STORE_CACHE_MAX_BYTES = APP_SETTINGS.VECTOR_STORE_CACHE_MAX_MB * 1024 * 1024
+VECTOR_INDEX_TYPE = APP_SETTINGS.VECTOR_INDEX_TYPE
+VECTOR_INDEX_PROMOTION_THRESHOLD = APP_SETTINGS.VECTOR_INDEX_PROMOTION_THRESHOLD
+VECTOR_INDEX_COMPRESSION = APP_SETTINGS.VECTOR_INDEX_COMPRESSION
+VECTOR_INDEX_MMAP = APP_SETTINGS.VECTOR_INDEX_MMAP
+VECTOR_INDEX_HNSW_M = 32
+VECTOR_INDEX_HNSW_EF_CONSTRUCTION = 80
+VECTOR_INDEX_HNSW_EF_SEARCH = 64
+VECTOR_INDEX_IVF_NPROBE = 16
+VECTOR_INDEX_PQ_M = 96  # 8-bit PQ sub-quantizers, 96 bytes per 384-dim vector (16x smaller)
+VECTOR_INDEX_RERANK_FACTOR = 4  # Compressed candidates per result rescored at full precision
+VECTOR_WAL_CHECKPOINT_BYTES = 64 * 1024 * 1024  # Log size that triggers an index snapshot
+VECTOR_WAL_CHECKPOINT_SECONDS = 600  # Age of unsnapshotted log records that triggers one
+VECTOR_WAL_FSYNC = True  # fsync every log append, off trades durability for ingest speed
+
+# Embedding Cache Configuration
+EMBEDDING_CACHE_PATH = os.path.join(VECTOR_STORE_FOLDER, "embedding_cache.sqlite3")
+EMBEDDING_CACHE_MAX_ENTRIES = APP_SETTINGS.EMBEDDING_CACHE_MAX_ENTRIES
+QUERY_EMBEDDING_CACHE_MAX_ENTRIES = 10_000  # Chat queries whose embeddings stay in memory
+QUERY_EMBEDDING_CACHE_TTL = 3600  # Seconds before a cached query embedding is recomputed
 
 os.makedirs(STATIC_FOLDER, exist_ok=True)
+os.makedirs(PRIVATE_FOLDER, exist_ok=True)
 os.makedirs(KB_FOLDER, exist_ok=True)
 os.makedirs(DOWNLOADS_FOLDER, exist_ok=True)
 os.makedirs(VECTOR_STORE_FOLDER, exist_ok=True)
+os.makedirs(UPLOAD_SPOOL_FOLDER, exist_ok=True)
@@ -0,0 +1,50 @@
+import math
+import threading
+import time
+from typing import Optional
+
+import tiktoken
+
+from src.core.settings import CHARS_PER_TOKEN, TOKENIZER_ENCODING, TOKENIZER_RETRY_SECONDS
+
+# Only a successful load is kept, a failed one is retried once the backoff passes
+_tokenizer: Optional[tiktoken.Encoding] = None
+_retry_at = 0.0
+_load_lock = threading.Lock()
+
+
+def get_tokenizer() -> Optional[tiktoken.Encoding]:
+    """Tokenizer used for prompt budgets, loaded once per process, None if unavailable"""
+    global _tokenizer, _retry_at
+    if _tokenizer is not None:
+        return _tokenizer
+    with _load_lock:
+        if _tokenizer is None and time.monotonic() >= _retry_at:
+            try:
+                _tokenizer = tiktoken.get_encoding(TOKENIZER_ENCODING)
+            except Exception as e:
+                # The encoding is downloaded on first use, offline hosts fall back to an estimate
+                print(f"Error loading tokenizer {TOKENIZER_ENCODING}, estimating from length: {e}")
+                _retry_at = time.monotonic() + TOKENIZER_RETRY_SECONDS
+        return _tokenizer
+
+
+def count_tokens(text: str) -> int:
+    """Number of tokens in text"""
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    return len(tokenizer.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Longest prefix of text that fits in max_tokens"""
+    if max_tokens <= 0:
+        return ""
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        return text[: max_tokens * CHARS_PER_TOKEN]
+    tokens = tokenizer.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return tokenizer.decode(tokens[:max_tokens])
@@ -0,0 +1,385 @@
+import math
+import time
+from typing import Any, Optional
+
+import faiss
+import numpy as np
+
+from src.core.settings import (
+    VECTOR_INDEX_HNSW_EF_CONSTRUCTION,
+    VECTOR_INDEX_HNSW_EF_SEARCH,
+    VECTOR_INDEX_HNSW_M,
+    VECTOR_INDEX_IVF_NPROBE,
+    VECTOR_INDEX_PQ_M,
+)
+
+INDEX_TYPES = ("flat", "hnsw", "ivf")
+COMPRESSIONS = ("none", "fp16", "sq8", "pq")
+
+_SQ_TYPES = {
+    "fp16": faiss.ScalarQuantizer.QT_fp16,
+    "sq8": faiss.ScalarQuantizer.QT_8bit,
+}
+# k-means of a PQ sub-quantizer needs at least one training vector per 8-bit centroid
+_PQ_MIN_TRAIN = 256
+
+# Flat codes and IVF lists are mapped straight from the file, older faiss only maps IVF lists
+MMAP_READ_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+class LayeredIndex:
+    """Read-only memory-mapped snapshot with in-memory additions and removals on top
+
+    Worker processes mapping the same snapshot share its pages through the page
+    cache. The mapped base is never written, changes are merged into a new snapshot
+    by materialize() at the next checkpoint.
+    """
+
+    def __init__(self, base: faiss.Index, path: str):
+        self.base = base
+        self.path = path
+        self.d = base.d
+        self.delta = faiss.IndexIDMap2(faiss.IndexFlatL2(base.d))
+        self.removed: set[int] = set()
+        self.base_ids = get_vector_ids(base)
+
+    @property
+    def ntotal(self) -> int:
+        return self.base.ntotal - len(self.removed) + self.delta.ntotal
+
+    def add_with_ids(self, vectors: np.ndarray, vector_ids: np.ndarray):
+        self.delta.add_with_ids(vectors, vector_ids)
+
+    def remove_ids(self, vector_ids: np.ndarray) -> int:
+        vector_ids = np.asarray(vector_ids, dtype="int64")
+        removed = self.delta.remove_ids(vector_ids)
+        in_base = vector_ids[np.isin(vector_ids, self.base_ids)]
+        new_tombstones = set(in_base.tolist()) - self.removed
+        self.removed.update(new_tombstones)
+        return removed + len(new_tombstones)
+
+    def search(
+        self, queries: np.ndarray, k: int, params: Optional[faiss.SearchParameters] = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Merged k nearest neighbours of the base without removed ids and the delta"""
+        candidates = []
+        if self.base.ntotal:
+            # Over-fetch so removed ids can be dropped and k results still remain
+            fetch_k = min(k + len(self.removed), self.base.ntotal)
+            candidates.append(self.base.search(queries, fetch_k, params=params))
+        if self.delta.ntotal:
+            delta_params = None
+            if params is not None:
+                delta_params = faiss.SearchParameters(sel=params.sel)
+            candidates.append(
+                self.delta.search(queries, min(k, self.delta.ntotal), params=delta_params)
+            )
+
+        merged_distances = np.full((len(queries), k), np.inf, dtype="float32")
+        merged_ids = np.full((len(queries), k), -1, dtype="int64")
+        for row in range(len(queries)):
+            hits = [
+                (float(distance), int(vector_id))
+                for distances, ids in candidates
+                for distance, vector_id in zip(distances[row], ids[row])
+                if vector_id != -1 and int(vector_id) not in self.removed
+            ]
+            hits.sort()
+            for column, (distance, vector_id) in enumerate(hits[:k]):
+                merged_distances[row, column] = distance
+                merged_ids[row, column] = vector_id
+        return merged_distances, merged_ids
+
+    def reconstruct(self, vector_id: int) -> np.ndarray:
+        if vector_id in self.removed:
+            raise RuntimeError(f"Vector {vector_id} was removed")
+        try:
+            return self.delta.reconstruct(vector_id)
+        except RuntimeError:
+            return self.base.reconstruct(vector_id)
+
+    def vector_ids(self) -> np.ndarray:
+        base_ids = self.base_ids
+        if self.removed:
+            base_ids = base_ids[~np.isin(base_ids, np.fromiter(self.removed, dtype="int64"))]
+        return np.concatenate([base_ids, faiss.vector_to_array(self.delta.id_map)])
+
+    def materialize(self) -> faiss.Index:
+        """Writable in-memory copy of the snapshot with the pending changes applied"""
+        index = faiss.read_index(self.path)
+        if self.removed:
+            index.remove_ids(np.fromiter(self.removed, dtype="int64"))
+        if self.delta.ntotal:
+            vectors = self.delta.index.reconstruct_n(0, self.delta.ntotal)
+            index.add_with_ids(vectors, faiss.vector_to_array(self.delta.id_map))
+        configure_index(index)
+        return index
+
+
+def materialize(index) -> faiss.Index:
+    """Plain faiss index that can be written to a snapshot"""
+    if isinstance(index, LayeredIndex):
+        return index.materialize()
+    return index
+
+
+def create_index(
+    index_type: str,
+    dimension: int,
+    train_vectors: Optional[np.ndarray] = None,
+    compression: str = "none",
+):
+    """Create an empty index of the given type that stores external vector ids
+
+    Flat and HNSW indexes are wrapped in an IndexIDMap2. IVF keeps ids natively in
+    its inverted lists, which is the only layout where remove_ids stays consistent.
+    Compressed indexes keep fp16, 8-bit scalar or product quantized codes instead of
+    float32 vectors, every encoding except fp16 is trained on the given vectors.
+    """
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unsupported vector compression: {compression}")
+    if compression != "none" and (train_vectors is None or len(train_vectors) == 0):
+        raise ValueError("Compressed index requires training vectors")
+    if compression == "pq" and len(train_vectors) < _PQ_MIN_TRAIN:
+        # Too few vectors to train the codebooks, still 4x smaller than float32
+        compression = "sq8"
+    pq_m = _pq_subquantizers(dimension)
+
+    if index_type == "flat":
+        if compression == "none":
+            base = faiss.IndexFlatL2(dimension)
+        elif compression == "pq":
+            base = faiss.IndexPQ(dimension, pq_m, 8)
+        else:
+            base = faiss.IndexScalarQuantizer(dimension, _SQ_TYPES[compression])
+        index = faiss.IndexIDMap2(base)
+    elif index_type == "hnsw":
+        if compression == "none":
+            base = faiss.IndexHNSWFlat(dimension, VECTOR_INDEX_HNSW_M)
+        elif compression == "pq":
+            base = faiss.IndexHNSWPQ(dimension, pq_m, VECTOR_INDEX_HNSW_M)
+        else:
+            base = faiss.IndexHNSWSQ(dimension, _SQ_TYPES[compression], VECTOR_INDEX_HNSW_M)
+        base.hnsw.efConstruction = VECTOR_INDEX_HNSW_EF_CONSTRUCTION
+        index = faiss.IndexIDMap2(base)
+    elif index_type == "ivf":
+        if train_vectors is None or len(train_vectors) == 0:
+            raise ValueError("IVF index requires training vectors")
+        # sqrt(n) lists keeps roughly 39+ training points per centroid
+        nlist = max(16, int(math.sqrt(len(train_vectors))))
+        quantizer = faiss.IndexFlatL2(dimension)
+        if compression == "none":
+            index = faiss.IndexIVFFlat(quantizer, dimension, nlist)
+        elif compression == "pq":
+            index = faiss.IndexIVFPQ(quantizer, dimension, nlist, pq_m, 8)
+        else:
+            index = faiss.IndexIVFScalarQuantizer(
+                quantizer, dimension, nlist, _SQ_TYPES[compression]
+            )
+    else:
+        raise ValueError(f"Unsupported vector index type: {index_type}")
+
+    if not index.is_trained:
+        index.train(train_vectors)
+    configure_index(index)
+    return index
+
+
+def _pq_subquantizers(dimension: int) -> int:
+    """Largest sub-quantizer count up to the configured one that divides the dimension"""
+    return max(m for m in range(1, min(VECTOR_INDEX_PQ_M, dimension) + 1) if dimension % m == 0)
+
+
+def build_index(
+    index_type: str, vector_ids: np.ndarray, vectors: np.ndarray, compression: str = "none"
+):
+    """Create an index of the given type populated with the given vectors"""
+    index = create_index(
+        index_type, vectors.shape[1], train_vectors=vectors, compression=compression
+    )
+    index.add_with_ids(vectors, vector_ids)
+    return index
+
+
+def _base_index(index):
+    if isinstance(index, LayeredIndex):
+        return _base_index(index.base)
+    if isinstance(index, faiss.IndexIDMap2):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def get_index_type(index) -> str:
+    """Index type of a vector store index"""
+    base = _base_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(base, faiss.IndexIVF):
+        return "ivf"
+    return "flat"
+
+
+def _codes(index):
+    """Index holding the vector codes, HNSW keeps them in a separate storage index"""
+    base = _base_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        return faiss.downcast_index(base.storage)
+    return base
+
+
+def get_compression(index) -> str:
+    """Encoding of the vectors stored in the index"""
+    codes = _codes(index)
+    if isinstance(codes, (faiss.IndexPQ, faiss.IndexIVFPQ)):
+        return "pq"
+    if isinstance(codes, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        return "fp16" if codes.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+    return "none"
+
+
+def supports_remove(index) -> bool:
+    """HNSW graphs can't drop vectors in place and must be rebuilt instead"""
+    return get_index_type(index) != "hnsw"
+
+
+def get_vector_ids(index) -> np.ndarray:
+    """External ids of all vectors in the index"""
+    if isinstance(index, LayeredIndex):
+        return index.vector_ids()
+    if isinstance(index, faiss.IndexIDMap2):
+        return faiss.vector_to_array(index.id_map)
+    invlists = index.invlists
+    ids = [
+        faiss.rev_swig_ptr(invlists.get_ids(list_no), invlists.list_size(list_no)).copy()
+        for list_no in range(index.nlist)
+        if invlists.list_size(list_no) > 0
+    ]
+    return np.concatenate(ids) if ids else np.empty(0, dtype="int64")
+
+
+def estimate_memory(index) -> int:
+    """Approximate resident size of the index in bytes"""
+    if isinstance(index, LayeredIndex):
+        # Mapped pages live in the shared page cache, only the layers are private
+        return (
+            index.delta.ntotal * (index.d * 4 + 16) + (len(index.base_ids) + len(index.removed)) * 8
+        )
+    base = _base_index(index)
+    per_vector = _codes(index).code_size
+    if isinstance(index, faiss.IndexIDMap2):
+        # Id map plus the reverse map entry kept for every vector
+        per_vector += 16
+    if isinstance(base, faiss.IndexHNSW):
+        per_vector += VECTOR_INDEX_HNSW_M * 2 * 4
+    elif isinstance(base, faiss.IndexIVF):
+        per_vector += 8
+    return index.ntotal * per_vector
+
+
+def configure_index(index):
+    """Apply search-time parameters to a freshly built or loaded index"""
+    base = _base_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efSearch = VECTOR_INDEX_HNSW_EF_SEARCH
+    elif isinstance(base, faiss.IndexIVF):
+        base.nprobe = VECTOR_INDEX_IVF_NPROBE
+
+
+def rerank(
+    query: np.ndarray,
+    hits: list[tuple[int, float]],
+    vector_ids: np.ndarray,
+    vectors: np.ndarray,
+    k: int,
+) -> list[tuple[int, float]]:
+    """Rescore (vector_id, distance) hits with exact distances, closest k first
+
+    Hits whose full-precision vector isn't given keep their approximate distance.
+    """
+    exact = {}
+    if len(vector_ids):
+        distances = ((vectors - query) ** 2).sum(axis=1)
+        exact = dict(zip(vector_ids.tolist(), distances.tolist()))
+    rescored = [(vector_id, exact.get(vector_id, distance)) for vector_id, distance in hits]
+    return sorted(rescored, key=lambda hit: hit[1])[:k]
+
+
+def search_index(
+    index, queries: np.ndarray, k: int, vector_ids: Optional[np.ndarray] = None
+) -> tuple[np.ndarray, np.ndarray]:
+    """k nearest neighbours, restricted to the given vector ids when they are set"""
+    if vector_ids is None:
+        return index.search(queries, k)
+
+    selector = faiss.IDSelectorBatch(np.ascontiguousarray(vector_ids, dtype="int64"))
+    # Parameters passed with a search replace the index defaults, so they are set again
+    base = _base_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        params = faiss.SearchParametersHNSW(sel=selector, efSearch=VECTOR_INDEX_HNSW_EF_SEARCH)
+    elif isinstance(base, faiss.IndexIVF):
+        params = faiss.SearchParametersIVF(sel=selector, nprobe=VECTOR_INDEX_IVF_NPROBE)
+    else:
+        params = faiss.SearchParameters(sel=selector)
+    return index.search(queries, k, params=params)
+
+
+def evaluate_index(
+    index,
+    vector_ids: np.ndarray,
+    vectors: np.ndarray,
+    k: int = 10,
+    n_queries: int = 200,
+    rerank_factor: int = 1,
+) -> dict[str, Any]:
+    """Recall@k and per-query latency of an index against exact search on the same vectors
+
+    With a rerank factor above one, recall is also measured after rescoring that many
+    candidates per result against the full-precision vectors.
+    """
+    rng = np.random.default_rng(0)
+    sample = rng.choice(len(vectors), size=min(n_queries, len(vectors)), replace=False)
+    # Perturb the sampled vectors so queries don't trivially hit themselves
+    noise = rng.normal(scale=0.01, size=(len(sample), vectors.shape[1])).astype("float32")
+    queries = vectors[sample] + noise
+    k = min(k, len(vectors))
+
+    exact = faiss.IndexIDMap2(faiss.IndexFlatL2(vectors.shape[1]))
+    exact.add_with_ids(vectors, vector_ids)
+
+    start_time = time.time()
+    _, expected = exact.search(queries, k)
+    exact_latency = (time.time() - start_time) / len(queries)
+
+    start_time = time.time()
+    _, found = index.search(queries, k)
+    latency = (time.time() - start_time) / len(queries)
+
+    hits = sum(len(set(found[i]) & set(expected[i])) for i in range(len(queries)))
+    stats = {
+        "recall_at_k": round(hits / (len(queries) * k), 4),
+        "k": k,
+        "search_latency_ms": round(latency * 1000, 3),
+        "exact_search_latency_ms": round(exact_latency * 1000, 3),
+    }
+    if rerank_factor <= 1:
+        return stats
+
+    positions = np.argsort(vector_ids)
+    sorted_ids = vector_ids[positions]
+    start_time = time.time()
+    distances, candidates = index.search(queries, min(k * rerank_factor, index.ntotal))
+    hits = 0
+    for i in range(len(queries)):
+        candidate_hits = [
+            (int(v), float(d)) for v, d in zip(candidates[i], distances[i]) if v != -1
+        ]
+        candidate_ids = np.array([vector_id for vector_id, _ in candidate_hits], dtype="int64")
+        rows = positions[np.searchsorted(sorted_ids, candidate_ids)]
+        reranked = rerank(queries[i], candidate_hits, candidate_ids, vectors[rows], k)
+        hits += len({vector_id for vector_id, _ in reranked} & set(expected[i].tolist()))
+    rerank_latency = (time.time() - start_time) / len(queries)
+
+    stats["reranked_recall_at_k"] = round(hits / (len(queries) * k), 4)
+    stats["rerank_factor"] = rerank_factor
+    stats["reranked_search_latency_ms"] = round(rerank_latency * 1000, 3)
+    return stats
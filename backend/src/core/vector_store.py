@@ -0,0 +1,898 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Iterable, Iterator, Optional
+from uuid import UUID
+
+import faiss
+import numpy as np
+
+from src.core.chunk_store import ChunkStore
+from src.core.embedding_cache import embedding_cache, query_embedding_cache
+from src.core.embedding_service import embedding_service
+from src.core.settings import (
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_MODEL,
+    SHARED_VECTOR_STORE_FOLDER,
+    VECTOR_INDEX_COMPRESSION,
+    VECTOR_INDEX_MMAP,
+    VECTOR_INDEX_PROMOTION_THRESHOLD,
+    VECTOR_INDEX_RERANK_FACTOR,
+    VECTOR_INDEX_TYPE,
+    VECTOR_STORE_BACKEND,
+    VECTOR_STORE_CACHE_MAX_BYTES,
+    VECTOR_STORE_FOLDER,
+    VECTOR_STORE_SHARDS,
+    VECTOR_WAL_CHECKPOINT_BYTES,
+    VECTOR_WAL_CHECKPOINT_SECONDS,
+    VECTOR_WAL_FSYNC,
+)
+from src.core.vector_index import (
+    MMAP_READ_FLAGS,
+    LayeredIndex,
+    build_index,
+    configure_index,
+    create_index,
+    estimate_memory,
+    evaluate_index,
+    get_compression,
+    get_index_type,
+    get_vector_ids,
+    materialize,
+    rerank,
+    search_index,
+    supports_remove,
+)
+from src.core.vector_wal import (
+    OP_ADD,
+    OP_REMOVE,
+    VectorWAL,
+    WALRecord,
+    file_lock,
+    list_snapshots,
+    write_snapshot,
+)
+
+
+class VectorStore:
+    """Handles vector storage and retrieval using FAISS"""
+
+    def __init__(
+        self,
+        user_id: Optional[UUID],
+        index_type: Optional[str] = None,
+        compression: Optional[str] = None,
+        vector_store_path: Optional[str] = None,
+    ):
+        self.user_id = user_id
+        # Stores start exact and are promoted to this type and encoding once they grow large
+        self.index_type = index_type or VECTOR_INDEX_TYPE
+        self.compression = compression or VECTOR_INDEX_COMPRESSION
+        # Encodes are batched with those of concurrent searches and uploads
+        self.encode = embedding_service.encoder(EMBEDDING_MODEL)
+        self.vector_store_path = vector_store_path or os.path.join(
+            VECTOR_STORE_FOLDER, str(user_id)
+        )
+        # Snapshots are faiss_index.<seq>, the bare name is the legacy single-file index
+        self.index_path = os.path.join(self.vector_store_path, "faiss_index")
+        self.wal_path = os.path.join(self.vector_store_path, "vectors.wal")
+        self.lock_path = os.path.join(self.vector_store_path, "store.lock")
+        self.chunk_store_path = os.path.join(self.vector_store_path, "chunks.sqlite3")
+        # Legacy sidecar, migrated into the chunk store on first load
+        self.metadata_path = os.path.join(self.vector_store_path, "metadata.json")
+
+        os.makedirs(self.vector_store_path, exist_ok=True)
+
+        # Guards the index while the store is shared between requests
+        self.lock = threading.RLock()
+        self._store_lock_depth = 0
+        self.chunk_store = ChunkStore(self.chunk_store_path)
+
+        # Load existing index
+        self.index = None
+        self.next_vector_id = 0
+        self.wal: Optional[VectorWAL] = None
+        # Last applied log sequence number, and the log position read up to
+        self.wal_seq = 0
+        self.wal_base = 0
+        self.wal_offset = 0
+        # When this worker first saw a log record that no snapshot covers yet
+        self.oldest_unsnapshotted: Optional[float] = None
+        self.index_stats: dict[str, Any] = {}
+        self._promotion_thread: Optional[threading.Thread] = None
+        with self._store_lock():
+            self.wal = VectorWAL(self.wal_path, fsync=VECTOR_WAL_FSYNC)
+            self._load_index()
+
+    @property
+    def label(self) -> str:
+        """Owner of the store as shown in logs"""
+        return f"user {self.user_id}"
+
+    @contextmanager
+    def _store_lock(self) -> Iterator[None]:
+        """Cross-process lock around log appends, replays and checkpoints
+
+        Reentrant within the thread holding self.lock, readers never take it.
+        """
+        with self.lock:
+            if self._store_lock_depth:
+                self._store_lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._store_lock_depth -= 1
+                return
+            with file_lock(self.lock_path):
+                self._store_lock_depth = 1
+                try:
+                    yield
+                finally:
+                    self._store_lock_depth = 0
+
+    def disk_version(self) -> tuple[Optional[int], int]:
+        """Log start and length, they change whenever any worker writes to the store"""
+        return self.wal.base_seq(), self.wal.size()
+
+    def memory_usage(self) -> int:
+        """Approximate resident size of the index in bytes"""
+        if self.index is None:
+            return 0
+        return estimate_memory(self.index)
+
+    def _load_index(self):
+        """Load the newest snapshot and replay the log on top of it, caller holds the store lock
+
+        Chunk metadata stays in the chunk store. If no snapshot matches the log, the
+        index is rebuilt from the vectors stored with the chunks instead of starting empty.
+        """
+        self.index = None
+        self.next_vector_id = 0
+        snapshot_seq = self._read_snapshot()
+
+        self.wal_base = self.wal.base_seq() or 0
+        records, self.wal_offset = self.wal.read()
+        # A torn record left by a crash would hide every record appended after it
+        self.wal.truncate(self.wal_offset)
+        self.wal_seq = max([snapshot_seq, self.wal_base] + [record.seq for record in records])
+
+        self.oldest_unsnapshotted = None
+        if snapshot_seq < self.wal_base:
+            # Records between the snapshot and the start of the log are gone
+            self._rebuild_from_chunk_store()
+        else:
+            for record in records:
+                if record.seq > snapshot_seq:
+                    self._apply(record)
+                    # Their append time isn't logged, they age from when they were loaded
+                    self._mark_unsnapshotted()
+
+        if os.path.exists(self.metadata_path):
+            self._migrate_metadata_file()
+
+        # Never reuse an id still present in the index, even if its row is gone
+        self.next_vector_id = max(self.next_vector_id, self.chunk_store.next_vector_id())
+        if self.index is not None and self.index.ntotal > 0:
+            max_index_id = int(get_vector_ids(self.index).max())
+            self.next_vector_id = max(self.next_vector_id, max_index_id + 1)
+
+        if snapshot_seq < self.wal_base:
+            self._checkpoint()
+
+    def _read_snapshot(self) -> int:
+        """Load the newest readable snapshot into self.index, return its sequence number"""
+        for seq, path in list_snapshots(self.vector_store_path):
+            try:
+                self.index = self._read_index_file(path)
+                return seq
+            except Exception as e:
+                print(f"Error loading index snapshot {path}: {e}")
+
+        if os.path.exists(self.index_path):
+            try:
+                # Written before the log existed, everything in the log comes after it
+                self.index = self._read_index_file(self.index_path)
+            except Exception as e:
+                print(f"Error loading index: {e}")
+                return -1
+        return 0
+
+    def _read_index_file(self, path: str):
+        index = faiss.read_index(path, MMAP_READ_FLAGS if VECTOR_INDEX_MMAP else 0)
+        if isinstance(index, faiss.IndexFlat):
+            # Stores written before stable ids used positional vector_index
+            index = self._migrate_positional_index(index)
+        elif VECTOR_INDEX_MMAP:
+            # Shared read-only mapping, writes accumulate in memory until the next checkpoint
+            index = LayeredIndex(index, path)
+        configure_index(index)
+        return index
+
+    def _rebuild_from_chunk_store(self):
+        """Rebuild a flat index from the full-precision vectors stored with the chunks"""
+        ids, vectors = self.chunk_store.get_embeddings()
+        if len(ids):
+            print(f"Rebuilding vector index of {self.label} from {len(ids)} stored vectors")
+            self.index = build_index("flat", ids, vectors)
+
+    @staticmethod
+    def _migrate_positional_index(index: faiss.Index) -> faiss.IndexIDMap2:
+        """Wrap a legacy positional index in an id map, using positions as vector ids"""
+        vectors = index.reconstruct_n(0, index.ntotal)
+        id_index = faiss.IndexIDMap2(faiss.IndexFlatL2(index.d))
+        id_index.add_with_ids(vectors, np.arange(index.ntotal, dtype="int64"))
+        return id_index
+
+    def _migrate_metadata_file(self):
+        """Move rows of the legacy metadata.json sidecar into the chunk store"""
+        try:
+            with open(self.metadata_path, "r", encoding="utf-8") as f:
+                metadata = json.load(f)
+            chunks = []
+            for m in metadata:
+                vector_id = m["vector_id"] if "vector_id" in m else m["vector_index"]
+                chunks.append(
+                    {
+                        "vector_id": vector_id,
+                        "kb_id": m["kb_id"],
+                        "filename": m["filename"],
+                        "chunk_index": m["chunk_index"],
+                        "text": m["text"],
+                    }
+                )
+            if self.chunk_store.count() == 0:
+                self.chunk_store.add_chunks(chunks)
+            os.remove(self.metadata_path)
+        except Exception as e:
+            print(f"Error migrating vector store metadata: {e}")
+
+    def reload_if_stale(self) -> bool:
+        """Replay writes of other workers, return True if anything was applied"""
+        with self.lock:
+            if self.disk_version() == (self.wal_base, self.wal_offset):
+                return False
+            with self._store_lock():
+                return self._catch_up()
+
+    def _catch_up(self) -> bool:
+        """Apply log records appended by other workers, caller holds the store lock"""
+        if self.wal.base_seq() != self.wal_base or self.wal.size() < self.wal_offset:
+            # Another worker checkpointed, start over from its snapshot
+            self._load_index()
+            return True
+        if self.wal.size() == self.wal_offset:
+            return False
+        records, self.wal_offset = self.wal.read(self.wal_offset)
+        self.wal.truncate(self.wal_offset)
+        for record in records:
+            if record.seq > self.wal_seq:
+                self._apply(record)
+                self.wal_seq = record.seq
+                self._mark_unsnapshotted()
+        return bool(records)
+
+    def _mark_unsnapshotted(self):
+        if self.oldest_unsnapshotted is None:
+            self.oldest_unsnapshotted = time.time()
+
+    def _log(self, op: int, vector_ids: np.ndarray, vectors: Optional[np.ndarray] = None):
+        """Append a record to the log, caller holds the store lock and has caught up"""
+        self.wal_seq += 1
+        self.wal_offset = self.wal.append(self.wal_seq, op, vector_ids, vectors)
+        self._mark_unsnapshotted()
+
+    def _apply(self, record: WALRecord):
+        if record.op == OP_ADD:
+            self._apply_add(record.ids, record.vectors)
+        elif record.op == OP_REMOVE:
+            self._apply_remove(record.ids)
+
+    def _apply_add(self, vector_ids: np.ndarray, vectors: np.ndarray):
+        if self.index is None:
+            self.index = create_index("flat", vectors.shape[1])
+        self.index.add_with_ids(vectors, vector_ids)
+        self.next_vector_id = max(self.next_vector_id, int(vector_ids.max()) + 1)
+
+    def _apply_remove(self, vector_ids: np.ndarray):
+        if self.index is None:
+            return
+        if supports_remove(self.index):
+            self.index.remove_ids(vector_ids)
+        else:
+            self._rebuild_without(vector_ids.tolist())
+        if self.index.ntotal == 0:
+            # No documents left
+            self.index = None
+
+    def _checkpoint(self):
+        """Snapshot the index and restart the log after it, caller holds the store lock
+
+        The snapshot is renamed into place before the log is reset, a crash at any
+        point leaves either the old or the new snapshot with a log that matches it.
+        """
+        superseded = list_snapshots(self.vector_store_path)
+        if self.index is not None:
+            # Layered indexes merge their mapped base with the in-memory changes here
+            path = write_snapshot(materialize(self.index), self.vector_store_path, self.wal_seq)
+            if VECTOR_INDEX_MMAP:
+                # Drop the private copy and map the snapshot just written
+                self.index = self._read_index_file(path)
+        self.wal.reset(self.wal_seq)
+        self.wal_base = self.wal_seq
+        self.wal_offset = self.wal.size()
+        self.oldest_unsnapshotted = None
+
+        for seq, path in superseded:
+            if seq != self.wal_seq or self.index is None:
+                os.remove(path)
+        if os.path.exists(self.index_path):
+            os.remove(self.index_path)
+
+    def _maybe_checkpoint(self):
+        """Checkpoint once the log is large or old enough, caller holds the store lock"""
+        log_size = self.wal_offset - self.wal.header_size
+        if log_size <= 0:
+            return
+        if log_size >= VECTOR_WAL_CHECKPOINT_BYTES or (
+            self.oldest_unsnapshotted is not None
+            and time.time() - self.oldest_unsnapshotted >= VECTOR_WAL_CHECKPOINT_SECONDS
+        ):
+            self._checkpoint()
+
+    def add_documents(
+        self, kb_id: str, chunks: list[str], filename: str, tenant: Optional[str] = None
+    ):
+        """Add document chunks to vector store, tagged with their user in a shared store"""
+        if not chunks:
+            return
+
+        self._add_batch(kb_id, chunks, filename, chunk_offset=0, tenant=tenant)
+        with self._store_lock():
+            self._maybe_checkpoint()
+
+        self._maybe_promote()
+
+    def add_documents_stream(
+        self,
+        kb_id: str,
+        chunks: Iterable[str],
+        filename: str,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        progress_callback: Optional[Callable[[int], None]] = None,
+        tenant: Optional[str] = None,
+    ) -> int:
+        """Embed and index chunks in fixed-size batches as they are produced
+
+        Memory is bounded by the batch size rather than the document size. Each
+        batch is only appended to the log, return the number of chunks added.
+        """
+        count = 0
+        batch: list[str] = []
+        for chunk in chunks:
+            batch.append(chunk)
+            if len(batch) >= batch_size:
+                self._add_batch(kb_id, batch, filename, chunk_offset=count, tenant=tenant)
+                count += len(batch)
+                batch = []
+                if progress_callback:
+                    progress_callback(count)
+
+        if batch:
+            self._add_batch(kb_id, batch, filename, chunk_offset=count, tenant=tenant)
+            count += len(batch)
+            if progress_callback:
+                progress_callback(count)
+
+        if count:
+            with self._store_lock():
+                self._maybe_checkpoint()
+            self._maybe_promote()
+
+        return count
+
+    def copy_documents(
+        self,
+        source: "VectorStore",
+        source_kb_id: str,
+        kb_id: str,
+        filename: str,
+        source_tenant: Optional[str] = None,
+        tenant: Optional[str] = None,
+    ) -> int:
+        """Copy a knowledge base's chunks and stored vectors under a new id
+
+        Only rows without a stored vector are embedded again, return the number of
+        chunks copied.
+        """
+        vector_ids = sorted(source.chunk_store.get_vector_ids(source_kb_id, source_tenant))
+        count = 0
+        for start in range(0, len(vector_ids), EMBEDDING_BATCH_SIZE):
+            batch = vector_ids[start : start + EMBEDDING_BATCH_SIZE]
+            chunks = source.chunk_store.get_chunks(batch)
+            stored_ids, stored_vectors = source._collect_vectors(np.array(batch, dtype="int64"))
+            stored = {int(vector_id): i for i, vector_id in enumerate(stored_ids)}
+
+            rows = [
+                {
+                    "kb_id": kb_id,
+                    "filename": filename,
+                    "chunk_index": chunks[vector_id]["chunk_index"],
+                    "text": chunks[vector_id]["text"],
+                    "user_id": tenant,
+                }
+                for vector_id in batch
+            ]
+            missing = [i for i, vector_id in enumerate(batch) if vector_id not in stored]
+            encoded = None
+            if missing:
+                encoded = embedding_cache.encode(
+                    EMBEDDING_MODEL, [rows[i]["text"] for i in missing], self.encode
+                )
+            # Either some vectors were stored or the rest were just encoded
+            dimension = stored_vectors.shape[1] if stored else encoded.shape[1]
+            embeddings = np.zeros((len(batch), dimension), dtype="float32")
+            for i, vector_id in enumerate(batch):
+                if vector_id in stored:
+                    embeddings[i] = stored_vectors[stored[vector_id]]
+            if missing:
+                embeddings[missing] = encoded
+
+            self._insert(rows, embeddings)
+            count += len(rows)
+
+        if count:
+            with self._store_lock():
+                self._maybe_checkpoint()
+            self._maybe_promote()
+
+        return count
+
+    def _add_batch(
+        self,
+        kb_id: str,
+        chunks: list[str],
+        filename: str,
+        chunk_offset: int,
+        tenant: Optional[str] = None,
+    ):
+        """Embed one batch of chunks and append it to the chunk store and index"""
+        # Generate embeddings, chunks embedded before are served from the cache
+        embeddings = embedding_cache.encode(EMBEDDING_MODEL, chunks, self.encode)
+        rows = [
+            {
+                "kb_id": kb_id,
+                "filename": filename,
+                "chunk_index": chunk_offset + i,
+                "text": chunk,
+                "user_id": tenant,
+            }
+            for i, chunk in enumerate(chunks)
+        ]
+        self._insert(rows, embeddings)
+
+    def _insert(self, rows: list[dict[str, Any]], embeddings: np.ndarray):
+        """Assign vector ids to chunk rows and append them to the chunk store and index"""
+        with self._store_lock():
+            # Ids handed out by other workers are seen in the log before allocating
+            self._catch_up()
+            start_id = self.next_vector_id
+            vector_ids = np.arange(start_id, start_id + len(rows), dtype="int64")
+
+            # The log goes first so a crash can only leave vectors without rows, which
+            # search skips, never rows that keyword search returns but no vector backs
+            self._log(OP_ADD, vector_ids, embeddings)
+            self.chunk_store.add_chunks(
+                [{**row, "vector_id": int(vector_ids[i])} for i, row in enumerate(rows)],
+                embeddings,
+            )
+
+            # Create or update FAISS index, vectors keep a stable id for their lifetime
+            self._apply_add(vector_ids, embeddings)
+
+    def search(self, query: str, k: int = 5, tenant: Optional[str] = None) -> list[dict[str, Any]]:
+        """Search for similar documents, only among the user's chunks in a shared store"""
+        if self.index is None or self.index.ntotal == 0:
+            return []
+
+        allowed_ids = None
+        if tenant is not None:
+            allowed_ids = self.chunk_store.get_user_vector_ids(tenant)
+            if len(allowed_ids) == 0:
+                return []
+
+        # Generate query embedding, repeated questions skip the model
+        query_embedding = query_embedding_cache.encode(EMBEDDING_MODEL, query, self.encode)[
+            np.newaxis, :
+        ]
+
+        with self.lock:
+            if self.index is None or self.index.ntotal == 0:
+                return []
+
+            # Compressed codes only approximate distances, over-fetch and rescore below
+            compressed = get_compression(self.index) != "none"
+            fetch_k = k * VECTOR_INDEX_RERANK_FACTOR if compressed else k
+
+            # Search
+            distances, vector_ids = search_index(
+                self.index, query_embedding, min(fetch_k, self.index.ntotal), allowed_ids
+            )
+
+        hits = [(int(v), float(d)) for v, d in zip(vector_ids[0], distances[0]) if v != -1]
+        if compressed:
+            stored_ids, stored_vectors = self.chunk_store.get_embeddings(
+                [vector_id for vector_id, _ in hits]
+            )
+            hits = rerank(query_embedding[0], hits, stored_ids, stored_vectors, k)
+
+        # Only the top-k rows are read from the chunk store
+        chunks = self.chunk_store.get_chunks([vector_id for vector_id, _ in hits])
+
+        # Return results
+        results = []
+        for vector_id, distance in hits:
+            chunk = chunks.get(vector_id)
+            if chunk is not None:
+                chunk["distance"] = distance
+                results.append(chunk)
+
+        return results
+
+    def keyword_search(
+        self, query: str, k: int = 5, tenant: Optional[str] = None
+    ) -> list[dict[str, Any]]:
+        """Search chunks by BM25 keyword relevance"""
+        hits = self.chunk_store.keyword_search(query, k, tenant)
+        chunks = self.chunk_store.get_chunks([vector_id for vector_id, _ in hits])
+
+        results = []
+        for vector_id, score in hits:
+            chunk = chunks.get(vector_id)
+            if chunk is not None:
+                chunk["bm25_score"] = score
+                results.append(chunk)
+
+        return results
+
+    def remove_documents(self, kb_id: str, tenant: Optional[str] = None):
+        """Remove a knowledge base's vectors by id, leaving the rest of the index untouched"""
+        with self._store_lock():
+            self._catch_up()
+            vector_ids = self.chunk_store.get_vector_ids(kb_id, tenant)
+            if not vector_ids:
+                return  # No documents to remove
+
+            # Rows go first, a crash before the log record only leaves vectors search skips
+            self.chunk_store.delete_kb(kb_id, tenant)
+            removed_ids = np.array(vector_ids, dtype="int64")
+            self._log(OP_REMOVE, removed_ids)
+
+            rebuilt = self.index is not None and not supports_remove(self.index)
+            self._apply_remove(removed_ids)
+            if rebuilt:
+                # Snapshot the rebuilt graph instead of rebuilding it again on replay
+                self._checkpoint()
+            else:
+                self._maybe_checkpoint()
+
+    def _collect_vectors(self, vector_ids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Full-precision vectors for the given ids, read from the chunk store
+
+        Rows written before vectors were stored are reconstructed from the index
+        and backfilled, so rebuilds never need to re-encode text.
+        """
+        ids, vectors = self.chunk_store.get_embeddings(vector_ids.tolist())
+        missing = np.setdiff1d(vector_ids, ids)
+        if len(missing) == 0:
+            return ids, vectors
+
+        with self.lock:
+            recovered_ids, recovered = [], []
+            for vector_id in missing:
+                try:
+                    recovered.append(self.index.reconstruct(int(vector_id)))
+                    recovered_ids.append(int(vector_id))
+                except RuntimeError:
+                    # IVF lists can't reconstruct without a direct map
+                    continue
+
+        if not recovered_ids:
+            print(f"Missing stored vectors for {len(missing)} chunks of {self.label}")
+            return ids, vectors
+
+        recovered_ids = np.array(recovered_ids, dtype="int64")
+        recovered = np.vstack(recovered).astype("float32")
+        self.chunk_store.set_embeddings(recovered_ids, recovered)
+        if len(ids) == 0:
+            return recovered_ids, recovered
+        return np.concatenate([ids, recovered_ids]), np.vstack([vectors, recovered])
+
+    def _rebuild_without(self, removed_ids: list[int]):
+        """Rebuild an index that can't remove in place from the remaining stored vectors"""
+        remaining = np.setdiff1d(get_vector_ids(self.index), np.array(removed_ids))
+        if len(remaining) == 0:
+            self.index = create_index("flat", self.index.d)
+            return
+        ids, vectors = self._collect_vectors(remaining)
+        self.index = build_index(
+            get_index_type(self.index), ids, vectors, get_compression(self.index)
+        )
+
+    def _maybe_promote(self):
+        """Start a background promotion once an exact flat index crosses the threshold"""
+        with self.lock:
+            if (
+                self.index is None
+                or (self.index_type == "flat" and self.compression == "none")
+                or get_index_type(self.index) != "flat"
+                or get_compression(self.index) != "none"
+                or self.index.ntotal < VECTOR_INDEX_PROMOTION_THRESHOLD
+                or (self._promotion_thread is not None and self._promotion_thread.is_alive())
+            ):
+                return
+            self._promotion_thread = threading.Thread(
+                target=self._promote, name=f"vector-index-promotion-{self.label}", daemon=True
+            )
+            self._promotion_thread.start()
+
+    def _promote(self):
+        """Build and train the ANN index off the request path, then swap it in"""
+        try:
+            start_time = time.time()
+            with self.lock:
+                snapshot_ids = get_vector_ids(self.index).copy()
+
+            ids, vectors = self._collect_vectors(snapshot_ids)
+            candidate = build_index(self.index_type, ids, vectors, self.compression)
+            rerank_factor = VECTOR_INDEX_RERANK_FACTOR if self.compression != "none" else 1
+            stats = evaluate_index(candidate, ids, vectors, rerank_factor=rerank_factor)
+
+            with self._store_lock():
+                # Catch up with writes that landed while the index was being built
+                self._catch_up()
+                if self.index is None:
+                    return
+                current_ids = get_vector_ids(self.index)
+                added = np.setdiff1d(current_ids, snapshot_ids)
+                removed = np.setdiff1d(snapshot_ids, current_ids)
+                if len(added):
+                    added_ids, added_vectors = self._collect_vectors(added)
+                    candidate.add_with_ids(added_vectors, added_ids)
+                if len(removed):
+                    if not supports_remove(candidate):
+                        # Retried on the next add rather than rebuilding twice here
+                        return
+                    candidate.remove_ids(removed)
+
+                self.index = candidate
+                self._checkpoint()
+                self.index_stats = {
+                    **stats,
+                    "promoted_at": time.time(),
+                    "build_seconds": round(time.time() - start_time, 3),
+                }
+
+            reranked = ""
+            if "reranked_recall_at_k" in stats:
+                reranked = f", {stats['reranked_recall_at_k']} reranked"
+            print(
+                f"Promoted vector index of {self.label} to {self.index_type} "
+                f"{get_compression(candidate)} ({candidate.ntotal} vectors, "
+                f"recall@{stats['k']}={stats['recall_at_k']}{reranked}, "
+                f"{stats['search_latency_ms']}ms vs {stats['exact_search_latency_ms']}ms exact)"
+            )
+        except Exception as e:
+            print(f"Error promoting vector index for {self.label}: {e}")
+
+    def get_index_stats(self) -> dict[str, Any]:
+        """Index type, size and the recall/latency measured at the last promotion"""
+        with self.lock:
+            return {
+                "user_id": str(self.user_id),
+                "index_type": get_index_type(self.index) if self.index is not None else None,
+                "target_index_type": self.index_type,
+                "compression": get_compression(self.index) if self.index is not None else None,
+                "target_compression": self.compression,
+                "vectors": self.index.ntotal if self.index is not None else 0,
+                "memory_mb": round(self.memory_usage() / 1024**2, 2),
+                **self.index_stats,
+            }
+
+
+class VectorShard(VectorStore):
+    """Shard of the shared vector store holding the chunks of many users
+
+    Every row is tagged with its user and searches are restricted to the caller's
+    vectors. Shards stay flat since filtered flat search is exact however few of the
+    vectors belong to the user, where graph walks and list probes would miss them.
+    """
+
+    def __init__(self, shard: int):
+        self.shard = shard
+        super().__init__(
+            None,
+            index_type="flat",
+            vector_store_path=os.path.join(SHARED_VECTOR_STORE_FOLDER, f"shard-{shard:03d}"),
+        )
+
+    @property
+    def label(self) -> str:
+        return f"shard {self.shard}"
+
+    def get_index_stats(self) -> dict[str, Any]:
+        return {**super().get_index_stats(), "user_id": None, "shard": self.shard}
+
+
+def shard_for(user_id: UUID) -> int:
+    """Shard holding a user's vectors, stable across processes and restarts"""
+    return UUID(str(user_id)).int % VECTOR_STORE_SHARDS
+
+
+class TenantVectorStore:
+    """A user's view of the shard holding their vectors, used like a per-user VectorStore"""
+
+    def __init__(self, shard: VectorShard, user_id: UUID):
+        self.shard = shard
+        self.user_id = user_id
+        self.tenant = str(user_id)
+
+    def add_documents(self, kb_id: str, chunks: list[str], filename: str):
+        self.shard.add_documents(kb_id, chunks, filename, tenant=self.tenant)
+
+    def add_documents_stream(
+        self,
+        kb_id: str,
+        chunks: Iterable[str],
+        filename: str,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        progress_callback: Optional[Callable[[int], None]] = None,
+    ) -> int:
+        return self.shard.add_documents_stream(
+            kb_id, chunks, filename, batch_size, progress_callback, tenant=self.tenant
+        )
+
+    def copy_documents(
+        self, source: "TenantVectorStore", source_kb_id: str, kb_id: str, filename: str
+    ) -> int:
+        return self.shard.copy_documents(
+            source.shard, source_kb_id, kb_id, filename, source.tenant, self.tenant
+        )
+
+    def search(self, query: str, k: int = 5) -> list[dict[str, Any]]:
+        return self.shard.search(query, k, tenant=self.tenant)
+
+    def keyword_search(self, query: str, k: int = 5) -> list[dict[str, Any]]:
+        return self.shard.keyword_search(query, k, tenant=self.tenant)
+
+    def remove_documents(self, kb_id: str):
+        self.shard.remove_documents(kb_id, tenant=self.tenant)
+
+    def memory_usage(self) -> int:
+        return self.shard.memory_usage()
+
+    def get_index_stats(self) -> dict[str, Any]:
+        return self.shard.get_index_stats()
+
+
+class VectorStoreCache:
+    """In-process LRU cache of loaded vector stores bounded by a memory budget
+
+    With the shared backend the cached stores are shards and users get a view of
+    the shard their vectors live in.
+    """
+
+    def __init__(self, max_bytes: int, backend: str = "per_user"):
+        self.max_bytes = max_bytes
+        self.backend = backend
+        self._stores: OrderedDict[str, VectorStore] = OrderedDict()
+        self._sizes: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.reloads = 0
+
+    def get(self, user_id: UUID) -> VectorStore | TenantVectorStore:
+        """Return the cached store for a user, loading it from disk on a miss"""
+        if self.backend == "shared":
+            shard = shard_for(user_id)
+            store = self._get(self._key(user_id), lambda: VectorShard(shard))
+            return TenantVectorStore(store, user_id)
+        return self._get(self._key(user_id), lambda: VectorStore(user_id))
+
+    def _key(self, user_id: UUID) -> str:
+        if self.backend == "shared":
+            return f"shard-{shard_for(user_id)}"
+        return str(user_id)
+
+    def _get(self, key: str, load: Callable[[], VectorStore]) -> VectorStore:
+        with self._lock:
+            store = self._stores.get(key)
+            if store is not None:
+                self._stores.move_to_end(key)
+                self.hits += 1
+
+        if store is not None:
+            # Another worker process may have written to the same store
+            if store.reload_if_stale():
+                with self._lock:
+                    self.reloads += 1
+                self._refresh(key)
+            return store
+
+        # Load outside the lock so a cold user doesn't block hot ones
+        store = load()
+        size = store.memory_usage()
+
+        with self._lock:
+            self.misses += 1
+            existing = self._stores.get(key)
+            if existing is not None:
+                # Lost a race with a concurrent loader, keep the instance already shared
+                self._stores.move_to_end(key)
+                return existing
+            self._stores[key] = store
+            self._sizes[key] = size
+            self._evict(keep=key)
+
+        return store
+
+    def refresh(self, user_id: UUID):
+        """Re-account the memory of a store after it was written to"""
+        self._refresh(self._key(user_id))
+
+    def _refresh(self, key: str):
+        with self._lock:
+            store = self._stores.get(key)
+            if store is None:
+                return
+        size = store.memory_usage()
+        with self._lock:
+            if key in self._stores:
+                self._sizes[key] = size
+                self._evict(keep=key)
+
+    def invalidate(self, user_id: UUID):
+        """Drop a user's store from the cache"""
+        key = self._key(user_id)
+        with self._lock:
+            self._stores.pop(key, None)
+            self._sizes.pop(key, None)
+
+    def _evict(self, keep: str):
+        """Evict least recently used stores until the budget is met, caller holds the lock"""
+        while sum(self._sizes.values()) > self.max_bytes and len(self._stores) > 1:
+            key = next(iter(self._stores))
+            if key == keep:
+                self._stores.move_to_end(key)
+                key = next(iter(self._stores))
+            self._stores.pop(key)
+            self._sizes.pop(key, None)
+            self.evictions += 1
+
+    def get_stats(self) -> dict[str, Any]:
+        """Hit/miss/eviction counters and current memory usage"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "reloads": self.reloads,
+                "cached_stores": len(self._stores),
+                "used_mb": round(sum(self._sizes.values()) / 1024**2, 2),
+                "max_mb": round(self.max_bytes / 1024**2, 2),
+            }
+
+    def get_index_stats(self) -> list[dict[str, Any]]:
+        """Index stats of every cached store"""
+        with self._lock:
+            stores = list(self._stores.values())
+        return [store.get_index_stats() for store in stores]
+
+
+# Global vector store cache instance
+vector_store_cache = VectorStoreCache(VECTOR_STORE_CACHE_MAX_BYTES, VECTOR_STORE_BACKEND)
@@ -0,0 +1,123 @@
+import argparse
+import os
+import shutil
+from typing import Any
+from uuid import UUID
+
+import numpy as np
+
+from src.core.embedding_cache import embedding_cache
+from src.core.settings import EMBEDDING_MODEL, VECTOR_STORE_FOLDER
+from src.core.vector_index import get_vector_ids
+from src.core.vector_store import VectorShard, VectorStore, shard_for
+
+MIGRATED_FOLDER = os.path.join(VECTOR_STORE_FOLDER, "migrated")
+BATCH_SIZE = 900  # Rows copied per batch, below SQLite's bound parameter limit
+
+
+def list_user_stores() -> list[UUID]:
+    """Users with a per-user vector store folder"""
+    user_ids = []
+    for name in sorted(os.listdir(VECTOR_STORE_FOLDER)):
+        if not os.path.isdir(os.path.join(VECTOR_STORE_FOLDER, name)):
+            continue
+        try:
+            user_ids.append(UUID(name))
+        except ValueError:
+            continue  # shared, migrated and other non-user folders
+    return user_ids
+
+
+def migrate_user(user_id: UUID, shards: dict[int, VectorShard]) -> int:
+    """Copy a user's chunks and stored vectors into their shard, return the chunks copied
+
+    Knowledge bases already in the shard are replaced, so an interrupted run can
+    simply be repeated. Text is only re-embedded for rows without a stored vector.
+    """
+    source = VectorStore(user_id)
+    shard_no = shard_for(user_id)
+    if shard_no not in shards:
+        shards[shard_no] = VectorShard(shard_no)
+    shard = shards[shard_no]
+    tenant = str(user_id)
+
+    if source.index is not None:
+        # Backfill vectors of rows written before they were kept in the chunk store
+        source._collect_vectors(get_vector_ids(source.index))
+
+    copied = 0
+    for kb_id in source.chunk_store.get_kb_ids():
+        shard.remove_documents(kb_id, tenant=tenant)
+        vector_ids = sorted(source.chunk_store.get_vector_ids(kb_id))
+        for start in range(0, len(vector_ids), BATCH_SIZE):
+            batch = vector_ids[start : start + BATCH_SIZE]
+            chunks = source.chunk_store.get_chunks(batch)
+            stored_ids, stored_vectors = source.chunk_store.get_embeddings(batch)
+            stored = {int(vector_id): i for i, vector_id in enumerate(stored_ids)}
+
+            rows: list[dict[str, Any]] = []
+            for vector_id in batch:
+                chunk = chunks[vector_id]
+                del chunk["vector_id"]
+                rows.append({**chunk, "user_id": tenant})
+
+            missing = [i for i, vector_id in enumerate(batch) if vector_id not in stored]
+            encoded = None
+            if missing:
+                encoded = embedding_cache.encode(
+                    EMBEDDING_MODEL,
+                    [rows[i]["text"] for i in missing],
+                    source.encode,
+                )
+            # Either some vectors were stored or the rest were just encoded
+            dimension = stored_vectors.shape[1] if stored else encoded.shape[1]
+            embeddings = np.zeros((len(batch), dimension), dtype="float32")
+            for i, vector_id in enumerate(batch):
+                if vector_id in stored:
+                    embeddings[i] = stored_vectors[stored[vector_id]]
+            if missing:
+                embeddings[missing] = encoded
+
+            shard._insert(rows, embeddings)
+            copied += len(rows)
+
+    source.chunk_store.close()
+    return copied
+
+
+def migrate_to_shared(keep: bool = False):
+    """Move every per-user vector store into the shared shards
+
+    Run with the API stopped. Migrated user folders are moved under the migrated
+    folder, or left in place with keep.
+    """
+    shards: dict[int, VectorShard] = {}
+    user_ids = list_user_stores()
+    print(f"Migrating {len(user_ids)} per-user vector stores into shared shards")
+
+    for user_id in user_ids:
+        try:
+            copied = migrate_user(user_id, shards)
+        except Exception as e:
+            print(f"Error migrating vector store of user {user_id}: {e}")
+            continue
+
+        if not keep:
+            os.makedirs(MIGRATED_FOLDER, exist_ok=True)
+            shutil.move(
+                os.path.join(VECTOR_STORE_FOLDER, str(user_id)),
+                os.path.join(MIGRATED_FOLDER, str(user_id)),
+            )
+        print(f"Migrated {copied} chunks of user {user_id} to shard {shard_for(user_id)}")
+
+    for shard in shards.values():
+        with shard._store_lock():
+            shard._checkpoint()
+    print("Set VECTOR_STORE_BACKEND=shared to serve from the shared shards")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate per-user vector stores to shards")
+    parser.add_argument("--keep", action="store_true", help="Leave the per-user folders in place")
+    args = parser.parse_args()
+    migrate_to_shared(keep=args.keep)
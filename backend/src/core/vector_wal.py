@@ -0,0 +1,180 @@
+import fcntl
+import os
+import re
+import struct
+import zlib
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+import faiss
+import numpy as np
+
+OP_ADD = 1
+OP_REMOVE = 2
+
+_WAL_MAGIC = b"QPVWAL01"
+# Magic and the sequence number of the snapshot the log applies on top of
+_FILE_HEADER = struct.Struct("<8sQ")
+# Sequence number, operation, number of ids and vector dimension
+_RECORD_HEADER = struct.Struct("<QBII")
+_CRC = struct.Struct("<I")
+
+SNAPSHOT_PREFIX = "faiss_index"
+_SNAPSHOT_PATTERN = re.compile(rf"^{SNAPSHOT_PREFIX}\.(\d+)$")
+
+
+class WALRecord:
+    """One logged add or remove of vectors"""
+
+    def __init__(self, seq: int, op: int, ids: np.ndarray, vectors: Optional[np.ndarray]):
+        self.seq = seq
+        self.op = op
+        self.ids = ids
+        self.vectors = vectors
+
+
+class VectorWAL:
+    """Append-only log of vector adds and removes applied on top of an index snapshot
+
+    Records are length-prefixed and checksummed, a torn record at the tail left by
+    a crash is detected on read and discarded.
+    """
+
+    def __init__(self, path: str, fsync: bool = True):
+        self.path = path
+        self.fsync = fsync
+        if self.base_seq() is None:
+            self.reset(0)
+
+    @property
+    def header_size(self) -> int:
+        return _FILE_HEADER.size
+
+    def base_seq(self) -> Optional[int]:
+        """Sequence number of the snapshot this log starts from, None if there is no log"""
+        try:
+            with open(self.path, "rb") as f:
+                header = f.read(_FILE_HEADER.size)
+        except FileNotFoundError:
+            return None
+        if len(header) < _FILE_HEADER.size:
+            return None
+        magic, base_seq = _FILE_HEADER.unpack(header)
+        return base_seq if magic == _WAL_MAGIC else None
+
+    def size(self) -> int:
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def append(
+        self, seq: int, op: int, ids: np.ndarray, vectors: Optional[np.ndarray] = None
+    ) -> int:
+        """Durably append a record, return the log size after it"""
+        ids = np.ascontiguousarray(ids, dtype="int64")
+        dimension = 0 if vectors is None else vectors.shape[1]
+        payload = _RECORD_HEADER.pack(seq, op, len(ids), dimension) + ids.tobytes()
+        if vectors is not None:
+            payload += np.ascontiguousarray(vectors, dtype="float32").tobytes()
+
+        with open(self.path, "ab") as f:
+            f.write(payload + _CRC.pack(zlib.crc32(payload)))
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+            return f.tell()
+
+    def read(self, offset: int = 0) -> tuple[list[WALRecord], int]:
+        """Complete records from offset on and the offset just past the last one"""
+        offset = max(offset, _FILE_HEADER.size)
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+
+        records = []
+        position = 0
+        while position + _RECORD_HEADER.size <= len(data):
+            seq, op, count, dimension = _RECORD_HEADER.unpack_from(data, position)
+            payload_size = _RECORD_HEADER.size + count * 8 + count * dimension * 4
+            end = position + payload_size + _CRC.size
+            if end > len(data):
+                break  # Torn write at the tail
+            payload = data[position : position + payload_size]
+            (crc,) = _CRC.unpack_from(data, position + payload_size)
+            if crc != zlib.crc32(payload):
+                break
+
+            ids_end = _RECORD_HEADER.size + count * 8
+            ids = np.frombuffer(payload, dtype="int64", count=count, offset=_RECORD_HEADER.size)
+            vectors = None
+            if op == OP_ADD:
+                vectors = np.frombuffer(payload, dtype="float32", offset=ids_end).reshape(
+                    count, dimension
+                )
+            records.append(WALRecord(seq, op, ids, vectors))
+            position = end
+
+        return records, offset + position
+
+    def truncate(self, offset: int):
+        """Drop everything past offset, used to discard a torn tail before appending"""
+        if self.size() > offset:
+            os.truncate(self.path, offset)
+
+    def reset(self, base_seq: int):
+        """Atomically replace the log with an empty one starting after base_seq"""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_FILE_HEADER.pack(_WAL_MAGIC, base_seq))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        fsync_dir(os.path.dirname(self.path))
+
+
+def fsync_dir(folder: str):
+    """Make renames inside a folder durable"""
+    fd = os.open(folder, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def snapshot_path(folder: str, seq: int) -> str:
+    return os.path.join(folder, f"{SNAPSHOT_PREFIX}.{seq}")
+
+
+def list_snapshots(folder: str) -> list[tuple[int, str]]:
+    """(seq, path) of the index snapshots in a folder, newest first"""
+    snapshots = []
+    for name in os.listdir(folder):
+        match = _SNAPSHOT_PATTERN.match(name)
+        if match:
+            snapshots.append((int(match.group(1)), os.path.join(folder, name)))
+    return sorted(snapshots, reverse=True)
+
+
+def write_snapshot(index: faiss.Index, folder: str, seq: int) -> str:
+    """Write an index snapshot, atomically renamed into place once it is on disk"""
+    path = snapshot_path(folder, seq)
+    tmp_path = path + ".tmp"
+    faiss.write_index(index, tmp_path)
+    with open(tmp_path, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    fsync_dir(folder)
+    return path
+
+
+@contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    """Exclusive advisory lock shared by every worker process on the host"""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
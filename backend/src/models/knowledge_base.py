@@ -19,20 +19,22 @@ class KnowledgeBase(SQLModel, table=True):
     file_path: str = Field(max_length=512)
     file_type: str = Field(max_length=10)
     file_size: int = Field(default=0)
+    # sha256 of the file, its blob is shared by every knowledge base with the same content
+    content_hash: Optional[str] = Field(default=None, max_length=64, index=True)
     upload_date: datetime = Field(
         default_factory=datetime.utcnow, sa_column=Column(DateTime(timezone=True))
     )
     processing_status: str = Field(
         default="pending", max_length=20
-    )  # pending, processing, completed, failed
+    )  # pending, processing, extracting, embedding, insights, completed, failed
 
     # Relationships - use string reference
     user: "User" = Relationship(back_populates="knowledge_bases")
     insight: Optional["KnowledgeBaseInsight"] = Relationship(back_populates="knowledge_base")
 
     def get_download_url(self) -> str:
-        """Get download URL for the knowledge base file"""
-        return file_storage.get_file_url(self.file_path)
+        """Get download URL for the knowledge base file, the route checks its owner"""
+        return f"/kb/download/{self.id}"
 
     def get_presigned_download_url(self, expiration: int = 3600) -> str:
         """Get presigned download URL for secure access (S3 only)"""
@@ -43,13 +45,26 @@ class KnowledgeBase(SQLModel, table=True):
         return self.get_download_url()
 
 
+class KnowledgeBaseBlob(SQLModel, table=True):
+    __tablename__ = "knowledge_base_blobs"
+
+    content_hash: str = Field(primary_key=True, max_length=64)  # sha256 of the content
+    file_path: str = Field(max_length=512)
+    file_size: int = Field(default=0)
+    ref_count: int = Field(default=0)  # Knowledge bases using the blob, deleted at zero
+    created_at: datetime = Field(
+        default_factory=datetime.utcnow, sa_column=Column(DateTime(timezone=True))
+    )
+
+
 class KnowledgeBaseInsight(SQLModel, table=True):
     __tablename__ = "knowledge_base_insights"
 
     id: UUID = Field(default_factory=uuid4, primary_key=True)
     knowledge_base_id: UUID = Field(foreign_key="knowledge_bases.id", unique=True, index=True)
-    summary: str = Field(sa_column=Column(Text))
-    key_insights: str = Field(sa_column=Column(Text))  # JSON array of insights
+    # Summary and key insights stay None until generated when insights are deferred
+    summary: Optional[str] = Field(default=None, sa_column=Column(Text))
+    key_insights: Optional[str] = Field(default=None, sa_column=Column(Text))  # JSON array
     entities: Optional[str] = Field(default=None, sa_column=Column(Text))  # JSON array of entities
     topics: Optional[str] = Field(default=None, sa_column=Column(Text))  # JSON array of topics
     processed_content: Optional[str] = Field(
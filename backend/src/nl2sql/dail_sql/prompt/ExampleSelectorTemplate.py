@@ -81,14 +81,14 @@ class CosineSimilarExampleSelector(BasicExampleSelector):
         self.SELECT_MODEL = "sentence-transformers/all-mpnet-base-v2"
         # self.SELECT_MODEL = "sentence-transformers/bert-base-nli-mean-tokens"
 
-        from sentence_transformers import SentenceTransformer
+        from src.core.embedding_service import embedding_service
 
-        self.bert_model = SentenceTransformer(self.SELECT_MODEL, device="cpu")
-        self.train_embeddings = self.bert_model.encode(self.train_questions)
+        # Target questions are batched with concurrent requests for the same model
+        self.encode = embedding_service.encoder(self.SELECT_MODEL, device="cpu")
+        self.train_embeddings = self.encode(self.train_questions)
 
     def get_examples(self, target, num_example, cross_domain=False):
-        target_embedding = self.bert_model.encode([target["question"]])
-        # target_embedding = self.bert_model.embed_text([target["question"]]).cpu().detach().numpy()
+        target_embedding = self.encode([target["question"]])
 
         # find the most similar question in train dataset
         from sklearn.metrics.pairwise import cosine_similarity
@@ -123,13 +123,14 @@ class EuclideanDistanceExampleSelector(BasicExampleSelector):
 
         self.SELECT_MODEL = "sentence-transformers/all-mpnet-base-v2"
 
-        from sentence_transformers import SentenceTransformer
+        from src.core.embedding_service import embedding_service
 
-        self.bert_model = SentenceTransformer(self.SELECT_MODEL, device="cpu")
-        self.train_embeddings = self.bert_model.encode(self.train_questions)
+        # Target questions are batched with concurrent requests for the same model
+        self.encode = embedding_service.encoder(self.SELECT_MODEL, device="cpu")
+        self.train_embeddings = self.encode(self.train_questions)
 
     def get_examples(self, target, num_example, cross_domain=False):
-        target_embedding = self.bert_model.encode([target["question"]])
+        target_embedding = self.encode([target["question"]])
 
         # find the most similar question in train dataset
         from sklearn.metrics.pairwise import euclidean_distances
@@ -164,13 +165,14 @@ class EuclideanDistanceThresholdExampleSelector(BasicExampleSelector):
         # self.top_distances = list()
         self.threshold = 0.85
 
-        from sentence_transformers import SentenceTransformer
+        from src.core.embedding_service import embedding_service
 
-        self.bert_model = SentenceTransformer(self.SELECT_MODEL, device="cpu")
-        self.train_embeddings = self.bert_model.encode(self.train_questions)
+        # Target questions are batched with concurrent requests for the same model
+        self.encode = embedding_service.encoder(self.SELECT_MODEL, device="cpu")
+        self.train_embeddings = self.encode(self.train_questions)
 
     def get_examples(self, target, num_example, cross_domain=False):
-        target_embedding = self.bert_model.encode([target["question"]])
+        target_embedding = self.encode([target["question"]])
 
         # find the most similar question in train dataset
         from sklearn.metrics.pairwise import euclidean_distances
@@ -210,19 +212,20 @@ class EuclideanDistanceSkeletonSimilarThresholdSelector(BasicExampleSelector):
         self.mask_token = "<mask>"  # the "<mask>" is the mask token of all-mpnet-base-v2
         self.value_token = "<unk>"  # the "<unk>" is the unknown token of all-mpnet-base-v2
 
-        from sentence_transformers import SentenceTransformer
+        from src.core.embedding_service import embedding_service
 
         train_mask_questions = mask_question_with_schema_linking(
             self.train_json, mask_tag=self.mask_token, value_tag=self.value_token
         )
-        self.bert_model = SentenceTransformer(self.SELECT_MODEL, device="cpu")
-        self.train_embeddings = self.bert_model.encode(train_mask_questions)
+        # Target questions are batched with concurrent requests for the same model
+        self.encode = embedding_service.encoder(self.SELECT_MODEL, device="cpu")
+        self.train_embeddings = self.encode(train_mask_questions)
 
     def get_examples(self, target, num_example, cross_domain=False):
         target_mask_question = mask_question_with_schema_linking(
             [target], mask_tag=self.mask_token, value_tag=self.value_token
         )
-        target_embedding = self.bert_model.encode(target_mask_question)
+        target_embedding = self.encode(target_mask_question)
 
         # find the most similar question in train dataset
         from sklearn.metrics.pairwise import euclidean_distances
@@ -283,13 +286,14 @@ class EuclideanDistanceQuestionMaskSelector(BasicExampleSelector):
         self.value_token = "<unk>"  # the "<unk>" is the unknown token of all-mpnet-base-v2
         self.embeddings_file = "train_embeddings.npy"
 
-        from sentence_transformers import SentenceTransformer
+        from src.core.embedding_service import embedding_service
 
         print("start loading bert model")
         train_mask_questions = mask_question_with_schema_linking(
             self.train_json, mask_tag=self.mask_token, value_tag=self.value_token
         )
-        self.bert_model = SentenceTransformer(self.SELECT_MODEL, device="cpu")
+        # Target questions are batched with concurrent requests for the same model
+        self.encode = embedding_service.encoder(self.SELECT_MODEL, device="cpu")
 
         # Try to load embeddings from file, if not found compute and save them
         try:
@@ -298,7 +302,7 @@ class EuclideanDistanceQuestionMaskSelector(BasicExampleSelector):
             print("Successfully loaded embeddings from file")
         except FileNotFoundError:
             print("Embeddings file not found, computing embeddings...")
-            self.train_embeddings = self.bert_model.encode(train_mask_questions)
+            self.train_embeddings = self.encode(train_mask_questions)
             print("Saving embeddings to file...")
             np.save(self.embeddings_file, self.train_embeddings)
             print("Successfully saved embeddings to file")
@@ -307,7 +311,7 @@ class EuclideanDistanceQuestionMaskSelector(BasicExampleSelector):
         target_mask_question = mask_question_with_schema_linking(
             [target], mask_tag=self.mask_token, value_tag=self.value_token
         )
-        target_embedding = self.bert_model.encode(target_mask_question)
+        target_embedding = self.encode(target_mask_question)
 
         # find the most similar question in train dataset
         from sklearn.metrics.pairwise import euclidean_distances
@@ -341,13 +345,14 @@ class EuclideanDistancePreSkeletonSimilarThresholdSelector(BasicExampleSelector)
         self.SELECT_MODEL = "sentence-transformers/all-mpnet-base-v2"
         self.threshold = 0.85
 
-        from sentence_transformers import SentenceTransformer
+        from src.core.embedding_service import embedding_service
 
-        self.bert_model = SentenceTransformer(self.SELECT_MODEL, device="cpu")
-        self.train_embeddings = self.bert_model.encode(self.train_questions)
+        # Target questions are batched with concurrent requests for the same model
+        self.encode = embedding_service.encoder(self.SELECT_MODEL, device="cpu")
+        self.train_embeddings = self.encode(self.train_questions)
 
     def get_examples(self, target, num_example, cross_domain=False):
-        target_embedding = self.bert_model.encode([target["question"]])
+        target_embedding = self.encode([target["question"]])
 
         # find the most similar question in train dataset
         from sklearn.metrics.pairwise import euclidean_distances
@@ -401,13 +406,14 @@ class EuclideanDistancePreSkeletonSimilarPlusSelector(BasicExampleSelector):
 
         self.SELECT_MODEL = "sentence-transformers/all-mpnet-base-v2"
 
-        from sentence_transformers import SentenceTransformer
+        from src.core.embedding_service import embedding_service
 
-        self.bert_model = SentenceTransformer(self.SELECT_MODEL, device="cpu")
-        self.train_embeddings = self.bert_model.encode(self.train_questions)
+        # Target questions are batched with concurrent requests for the same model
+        self.encode = embedding_service.encoder(self.SELECT_MODEL, device="cpu")
+        self.train_embeddings = self.encode(self.train_questions)
 
     def get_examples(self, target, num_example, cross_domain=False):
-        target_embedding = self.bert_model.encode([target["question"]])
+        target_embedding = self.encode([target["question"]])
 
         # find the most similar question in train dataset
         from sklearn.metrics.pairwise import euclidean_distances
@@ -446,19 +452,20 @@ class EuclideanDistanceQuestionMaskPreSkeletonSimilarThresholdSelector(BasicExam
         self.value_token = "<unk>"  # the "<unk>" is the unknown token of all-mpnet-base-v2
         self.threshold = 0.85
 
-        from sentence_transformers import SentenceTransformer
+        from src.core.embedding_service import embedding_service
 
         train_mask_questions = mask_question_with_schema_linking(
             self.train_json, mask_tag=self.mask_token, value_tag=self.value_token
         )
-        self.bert_model = SentenceTransformer(self.SELECT_MODEL, device="cpu")
-        self.train_embeddings = self.bert_model.encode(train_mask_questions)
+        # Target questions are batched with concurrent requests for the same model
+        self.encode = embedding_service.encoder(self.SELECT_MODEL, device="cpu")
+        self.train_embeddings = self.encode(train_mask_questions)
 
     def get_examples(self, target, num_example, cross_domain=False):
         target_mask_question = mask_question_with_schema_linking(
             [target], mask_tag=self.mask_token, value_tag=self.value_token
         )
-        target_embedding = self.bert_model.encode(target_mask_question)
+        target_embedding = self.encode(target_mask_question)
 
         # find the most similar question in train dataset
         from sklearn.metrics.pairwise import euclidean_distances
@@ -515,19 +522,20 @@ class EuclideanDistanceQuestionMaskPreSkeletonSimilarThresholdShiftSelector(Basi
         self.value_token = "<unk>"  # the "<unk>" is the unknown token of all-mpnet-base-v2
         self.threshold = 0.85
 
-        from sentence_transformers import SentenceTransformer
+        from src.core.embedding_service import embedding_service
 
         train_mask_questions = mask_question_with_schema_linking(
             self.train_json, mask_tag=self.mask_token, value_tag=self.value_token
         )
-        self.bert_model = SentenceTransformer(self.SELECT_MODEL, device="cpu")
-        self.train_embeddings = self.bert_model.encode(train_mask_questions)
+        # Target questions are batched with concurrent requests for the same model
+        self.encode = embedding_service.encoder(self.SELECT_MODEL, device="cpu")
+        self.train_embeddings = self.encode(train_mask_questions)
 
     def get_examples(self, target, num_example, cross_domain=False):
         target_mask_question = mask_question_with_schema_linking(
             [target], mask_tag=self.mask_token, value_tag=self.value_token
         )
-        target_embedding = self.bert_model.encode(target_mask_question)
+        target_embedding = self.encode(target_mask_question)
 
         # find the most similar question in train dataset
         from sklearn.metrics.pairwise import euclidean_distances
@@ -7,6 +7,8 @@ import torch
 from requests.exceptions import HTTPError
 from sentence_transformers import SentenceTransformer
 
+from src.core.embeddings import embedding_registry
+
 # Load spaCy model
 try:
     nlp = spacy.load("en_core_web_sm")
@@ -19,22 +21,24 @@ except OSError:
 
 
 def load_sentence_transformer(
-    model_name: str, max_retries: int = 3, retry_delay: int = 5
+    model_name: str, max_retries: int = 3, retry_delay: int = 5, device: str | None = None
 ) -> SentenceTransformer | None:
     """
     Load a sentence transformer model with retry logic for handling rate limits.
+    The model is shared through the process-wide embedding registry.
 
     Args:
         model_name: Name of the model to load
         max_retries: Maximum number of retry attempts
         retry_delay: Delay between retries in seconds
+        device: Device to load the model on, None lets SentenceTransformer decide
 
     Returns:
         Loaded SentenceTransformer model or None if all retries failed
     """
     for attempt in range(max_retries):
         try:
-            return SentenceTransformer(model_name)
+            return embedding_registry.get_model(model_name, device=device)
         except HTTPError as e:
             if e.response.status_code == 429:  # Rate limit error
                 if attempt < max_retries - 1:
@@ -87,6 +91,7 @@ class TransformerEmbedder(Embedder):
             model_name: Name of the Sentence Transformer model to use
             lemmatize: Whether to lemmatize tokens before embedding
         """
+        self.model_name = model_name
         self.model = load_sentence_transformer(model_name)
         if self.model is None:
             raise RuntimeError(f"Failed to load model {model_name} after multiple retries")
@@ -143,7 +148,12 @@ class TransformerEmbedder(Embedder):
         return True  # Transformers can handle any token
 
     def to(self, device):
-        self.model = self.model.to(device)
+        # The model is shared through the registry, so fetch the instance for the target device
+        # instead of moving the shared instance in place
+        model = load_sentence_transformer(self.model_name, device=str(device))
+        if model is None:
+            raise RuntimeError(f"Failed to load model {self.model_name} on {device}")
+        self.model = model
         # Move cached embeddings to device
         for token in self._token_cache:
             self._token_cache[token] = self._token_cache[token].to(device)
@@ -0,0 +1,9 @@
+import os
+import tempfile
+
+# Settings are read when src is imported: required secrets get dummy values and the
+# relative static folders and database are created in a scratch directory
+os.environ.setdefault("DEEPSEEK_API_KEY", "test")
+os.environ.setdefault("SECRET_KEY", "test")
+os.chdir(tempfile.mkdtemp(prefix="querypilot-tests-"))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(os.getcwd(), 'test.db')}")
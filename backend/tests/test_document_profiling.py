@@ -0,0 +1,83 @@
+import numpy as np
+import openpyxl
+import pandas as pd
+import pytest
+from openpyxl.styles import PatternFill
+
+from src.core.document_profiling import ExcelProfiler, StreamingCSVProfiler
+
+
+def profile_full_read(file_path: str) -> str:
+    """Profile of the whole CSV read at once, the format the streaming profiler matches"""
+    df = pd.read_csv(file_path)
+    text = f"Dataset with {len(df)} rows and {len(df.columns)} columns.\n"
+    text += f"Columns: {', '.join(df.columns.tolist())}\n\n"
+    text += "Sample data:\n"
+    text += df.head().to_string() + "\n\n"
+    numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+    if numeric_cols:
+        text += "Statistical summary for numeric columns:\n"
+        text += df[numeric_cols].describe().to_string() + "\n\n"
+    categorical_cols = df.select_dtypes(include=["object"]).columns.tolist()
+    for col in categorical_cols[:3]:
+        text += f"Value counts for {col}:\n"
+        text += df[col].value_counts().head().to_string() + "\n\n"
+    return text.strip()
+
+
+@pytest.mark.parametrize(
+    "codes",
+    [
+        # Numeric in the first chunks, text only later
+        ["7", "7", "7", "1.50", "2", "7", "A1", "B2", "7", "A1", "3", "1.50"],
+        # Text first, then whole chunks that parse as numeric
+        ["A1", "7", "B2", "7", "7", "1.50", "7", "2", "3", "A1", "7", "1.50"],
+    ],
+)
+def test_column_switching_type_between_chunks(tmp_path, codes):
+    file_path = tmp_path / "mixed.csv"
+    rows = ["id,code,city"]
+    cities = ["Hanoi", "Hue", "Hanoi", "Da Nang", "Hanoi", "Hue"] * 2
+    for i, (code, city) in enumerate(zip(codes, cities)):
+        rows.append(f"{i},{code},{city}")
+    file_path.write_text("\n".join(rows) + "\n")
+
+    profile = StreamingCSVProfiler(chunk_rows=3).profile(str(file_path))
+
+    assert profile == profile_full_read(str(file_path))
+    assert "Value counts for code:" in profile
+
+
+def test_numeric_columns_match_full_read(tmp_path):
+    file_path = tmp_path / "numeric.csv"
+    rng = np.random.default_rng(0)
+    pd.DataFrame(
+        {"amount": rng.integers(0, 100, 50), "branch": rng.choice(["HN", "HCM", "DN"], 50)}
+    ).to_csv(file_path, index=False)
+
+    profile = StreamingCSVProfiler(chunk_rows=7).profile(str(file_path))
+
+    assert profile == profile_full_read(str(file_path))
+
+
+def test_excel_row_count_matches_full_read(tmp_path):
+    file_path = tmp_path / "blank_rows.xlsx"
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = "Sales"
+    # Leading blank rows, a blank row between the data and styled empty rows below it
+    sheet.append([])
+    sheet.append([])
+    sheet.append(["branch", "amount"])
+    for i in range(5):
+        sheet.append([f"B{i}", i * 10])
+    sheet.append([])
+    sheet.append(["B9", 90])
+    for row in range(12, 30):
+        sheet.cell(row=row, column=1).fill = PatternFill("solid", fgColor="FFFF00")
+    workbook.save(file_path)
+
+    profile = ExcelProfiler().profile(str(file_path))
+
+    rows = len(pd.read_excel(file_path, sheet_name="Sales"))
+    assert f"Size: {rows} rows, 2 columns" in profile
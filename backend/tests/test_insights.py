@@ -0,0 +1,110 @@
+from uuid import uuid4
+
+import pytest
+
+pytest.importorskip("sentence_transformers")
+
+from sqlmodel import Session, SQLModel, delete, select  # noqa: E402
+
+import src.models.chat  # noqa: E402, F401  (every table, for create_all)
+import src.models.user  # noqa: E402, F401
+from src.core.db import engine  # noqa: E402
+from src.core.insights import InsightGenerator  # noqa: E402
+from src.core.rag import rag_service  # noqa: E402
+from src.models.knowledge_base import KnowledgeBase, KnowledgeBaseInsight  # noqa: E402
+
+GENERATED = {"summary": "Summary", "key_insights": ["Insight"], "entities": [], "topics": []}
+
+
+def add_deferred_kb(user_id, content_hash=None):
+    """A completed knowledge base whose insight was deferred"""
+    SQLModel.metadata.create_all(engine)
+    kb = KnowledgeBase(
+        user_id=user_id,
+        filename="notes.txt",
+        original_filename="notes.txt",
+        file_path="",
+        file_type="txt",
+        content_hash=content_hash,
+        processing_status="completed",
+    )
+    with Session(engine) as session:
+        session.add(kb)
+        session.add(KnowledgeBaseInsight(knowledge_base_id=kb.id, processed_content="Some text"))
+        session.commit()
+        return kb.id
+
+
+@pytest.fixture
+def deferred_kb():
+    return add_deferred_kb(uuid4())
+
+
+def delete_kb(kb_id, with_insight: bool = True):
+    with Session(engine) as session:
+        if with_insight:
+            session.exec(
+                delete(KnowledgeBaseInsight).where(KnowledgeBaseInsight.knowledge_base_id == kb_id)
+            )
+        session.exec(delete(KnowledgeBase).where(KnowledgeBase.id == kb_id))
+        session.commit()
+
+
+def test_background_run_skips_deleted_knowledge_base(deferred_kb, monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        rag_service, "generate_insights", lambda content: calls.append(content) or GENERATED
+    )
+    generator = InsightGenerator("background")
+
+    # Deleted between the ingestion completing and the queued run
+    delete_kb(deferred_kb, with_insight=False)
+    generator.schedule(deferred_kb)
+    generator._executor.shutdown(wait=True)
+
+    assert calls == []
+    assert generator.get_stats() == {"mode": "background", "generated": 0, "pending": 0}
+
+
+def test_deletion_during_generation_is_ignored(deferred_kb, monkeypatch):
+    def generate_while_deleted(content):
+        delete_kb(deferred_kb)
+        return GENERATED
+
+    monkeypatch.setattr(rag_service, "generate_insights", generate_while_deleted)
+    generator = InsightGenerator("background")
+
+    assert generator.generate(deferred_kb) is None
+    assert generator.generated == 0
+    with Session(engine) as session:
+        statement = select(KnowledgeBaseInsight).where(
+            KnowledgeBaseInsight.knowledge_base_id == deferred_kb
+        )
+        assert session.exec(statement).first() is None
+
+
+def test_copies_of_a_file_share_one_generation(monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        rag_service, "generate_insights", lambda content: calls.append(content) or GENERATED
+    )
+    generator = InsightGenerator("background")
+    user_id = uuid4()
+    content_hash = uuid4().hex
+
+    # A reused upload is queued after the copy it was made from
+    source = add_deferred_kb(user_id, content_hash)
+    copy = add_deferred_kb(user_id, content_hash)
+    generator.schedule(source)
+    generator.schedule(copy)
+    generator._executor.shutdown(wait=True)
+
+    assert len(calls) == 1
+    with Session(engine) as session:
+        for kb_id in (source, copy):
+            statement = select(KnowledgeBaseInsight).where(
+                KnowledgeBaseInsight.knowledge_base_id == kb_id
+            )
+            insight = session.exec(statement).first()
+            assert insight.summary == "Summary"
+            assert insight.get_key_insights() == ["Insight"]
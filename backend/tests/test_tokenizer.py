@@ -0,0 +1,53 @@
+import pytest
+
+from src.core import tokenizer
+from src.core.settings import TOKENIZER_RETRY_SECONDS
+
+
+class CharacterEncoding:
+    """Stands in for a tiktoken encoding, one token per character"""
+
+    def encode(self, text, disallowed_special=()):
+        return list(text)
+
+    def decode(self, tokens):
+        return "".join(tokens)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable monotonic time, starting with no tokenizer loaded"""
+    now = [1000.0]
+    monkeypatch.setattr(tokenizer.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(tokenizer, "_tokenizer", None)
+    monkeypatch.setattr(tokenizer, "_retry_at", 0.0)
+    return now
+
+
+def test_failed_load_falls_back_then_retries_after_backoff(clock, monkeypatch):
+    loads = []
+
+    def unavailable(name):
+        loads.append(name)
+        raise ConnectionError("offline")
+
+    monkeypatch.setattr(tokenizer.tiktoken, "get_encoding", unavailable)
+    assert tokenizer.count_tokens("x" * 10) == 3
+    assert tokenizer.truncate_to_tokens("x" * 10, 2) == "x" * 8
+    # Still within the backoff, the estimate is used without another load
+    assert len(loads) == 1
+
+    monkeypatch.setattr(tokenizer.tiktoken, "get_encoding", lambda name: CharacterEncoding())
+    clock[0] += TOKENIZER_RETRY_SECONDS
+    assert tokenizer.count_tokens("x" * 10) == 10
+    assert tokenizer.truncate_to_tokens("x" * 10, 2) == "xx"
+
+
+def test_successful_load_is_kept(clock, monkeypatch):
+    loads = []
+    monkeypatch.setattr(
+        tokenizer.tiktoken, "get_encoding", lambda name: loads.append(name) or CharacterEncoding()
+    )
+    assert tokenizer.count_tokens("abc") == 3
+    assert tokenizer.count_tokens("abcd") == 4
+    assert loads == [tokenizer.TOKENIZER_ENCODING]